@@ -16,4 +16,6 @@ for module in $(find $module_dir | grep "\.py$" | awk -F / '{print $(NF)}' | sed
     if [ $? -ne 0 ] ; then
       exit 1
     fi
-done
\ No newline at end of file
+done
+
+ansible-test units --python $version test/units/modules/salf_made/
@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019, sky-joker
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import os
+import tempfile
+import time
+
+from multiprocessing.pool import ThreadPool
+
+from ansible.module_utils.connection import Connection
+
+try:
+    import requests
+    from requests.packages.urllib3.exceptions import InsecureRequestWarning
+    requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+    HAS_REQUESTS = True
+except ImportError:
+    HAS_REQUESTS = False
+
+
+class ZabbixAPIError(Exception):
+    pass
+
+
+class ZabbixNotFoundError(ZabbixAPIError):
+    """The names or the hosts looked up are not found"""
+    pass
+
+
+class ZabbixAPIMethod(object):
+    """Call the api method of the prefix, like ZabbixAPISubClass of zabbix-api"""
+    def __init__(self, zapi, prefix):
+        self._zapi = zapi
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def method(params=None):
+            if params is None:
+                params = {}
+            return self._zapi.do_request('%s.%s' % (self._prefix, name), params)
+        return method
+
+
+def get_jsonrpc_requests(calls, auth=None, request_id=0):
+    """Build the JSON-RPC 2.0 requests of the list of (method, params) with the IDs following request_id"""
+    data = []
+    for method, params in calls:
+        request_id += 1
+        request = {
+            'jsonrpc': '2.0',
+            'method': method,
+            'params': params,
+            'id': request_id
+        }
+        if auth and method not in ('user.login', 'apiinfo.version'):
+            request['auth'] = auth
+        data.append(request)
+    return data
+
+
+def get_jsonrpc_body(data):
+    """Dump the requests, sending a single call as a plain request for the servers not supporting batch requests"""
+    return json.dumps(data if len(data) > 1 else data[0])
+
+
+def get_jsonrpc_results(data, response_text):
+    """Match the responses to the requests by ID and return the results in the order of the requests"""
+    try:
+        responses = json.loads(response_text)
+    except ValueError:
+        raise ZabbixAPIError('Invalid JSON response: %s' % response_text)
+    if isinstance(responses, dict):
+        responses = [responses]
+
+    responses_by_id = dict((x.get('id'), x) for x in responses)
+    results = []
+    for request in data:
+        response = responses_by_id.get(request['id'])
+        if response is None:
+            # The whole request is rejected, for example by a parse error.
+            response = responses[0]
+        if 'error' in response:
+            raise ZabbixAPIError('%s: %s: %s' % (request['method'], response['error'].get('message'),
+                                                 response['error'].get('data')))
+        results.append(response['result'])
+    return results
+
+
+class ZabbixAPIBase(object):
+    """Common interface of the Zabbix API clients
+
+    The api methods are called like zabbix-api, for example zbx.host.get(params),
+    and several calls can be sent in one HTTP round trip with batch().
+    The time of each round trip is recorded to latency.
+    The subclasses send the calls with _send_batch(calls).
+    """
+    def __init__(self):
+        self.latency = []
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return ZabbixAPIMethod(self, name)
+
+    def do_request(self, method, params):
+        return self.batch([(method, params)])[0]
+
+    def batch(self, calls):
+        """Send the list of (method, params) and return the list of the results in the same order"""
+        if not calls:
+            return []
+
+        start = time.time()
+        results = self._send_batch(calls)
+        self.latency.append({
+            'methods': [method for method, params in calls],
+            'seconds': round(time.time() - start, 6)
+        })
+        return results
+
+
+class ZabbixJsonRpcClient(ZabbixAPIBase):
+    """Zabbix API client sending JSON-RPC 2.0 requests over a pooled keep-alive session"""
+    def __init__(self, server_url, timeout=10, http_login_user=None, http_login_password=None, validate_certs=True):
+        super(ZabbixJsonRpcClient, self).__init__()
+        self.url = '%s/api_jsonrpc.php' % server_url.rstrip('/')
+        self.timeout = timeout
+        self.auth = None
+        self._request_id = 0
+        self._session = requests.Session()
+        self._session.verify = validate_certs
+        self._session.headers['Content-Type'] = 'application/json-rpc'
+        if http_login_user:
+            self._session.auth = (http_login_user, http_login_password)
+
+    def login(self, user, password):
+        self.auth = None
+        self.auth = self.do_request('user.login', {'user': user, 'password': password})
+
+    def logout(self):
+        if self.auth:
+            self.do_request('user.logout', [])
+            self.auth = None
+        self._session.close()
+
+    def _send_batch(self, calls):
+        data = get_jsonrpc_requests(calls, self.auth, self._request_id)
+        self._request_id += len(data)
+
+        r = self._session.post(self.url, data=get_jsonrpc_body(data), timeout=self.timeout)
+        if r.status_code != 200:
+            raise ZabbixAPIError('HTTP %s: %s' % (r.status_code, r.text))
+        return get_jsonrpc_results(data, r.text)
+
+
+class ZabbixConnectionAPI(ZabbixAPIBase):
+    """Zabbix API client using the persistent httpapi connection
+
+    The httpapi plugin logs in once per play and logs out when the connection is closed,
+    so the tasks reuse the same auth token instead of calling user.login every time.
+    """
+    def __init__(self, module):
+        super(ZabbixConnectionAPI, self).__init__()
+        self._connection = Connection(module._socket_path)
+
+    def _send_batch(self, calls):
+        return self._connection.send_batch([[method, params] for method, params in calls])
+
+
+TAG_OPERATORS = {
+    'like': 0,
+    'equal': 1
+}
+
+
+def get_ids_by_names(api, id_key, name_key, names):
+    """Get the IDs of the objects by names with a single call, raising ZabbixNotFoundError for the names not found"""
+    objects = api.get({
+        'output': [id_key, name_key],
+        'filter': {
+            name_key: names
+        }
+    })
+
+    found_names = set(x[name_key] for x in objects)
+    missing = [x for x in names if x not in found_names]
+    if missing:
+        raise ZabbixNotFoundError("Not found: %s" % ", ".join(missing))
+    return [x[id_key] for x in objects]
+
+
+class ZabbixHostQuery(object):
+    """Query the hosts and their inventory with host.get
+
+    This is shared by the zabbix_host_inventory_facts module and the zabbix_host_inventory inventory plugin.
+    The names which are not found raise ZabbixAPIError.
+    """
+    def __init__(self, zapi, host_fields=None, inventory_fields=None, page_size=1000, max_workers=1):
+        self._zapi = zapi
+        self.host_fields = host_fields
+        self.inventory_fields = inventory_fields
+        self.page_size = page_size
+        self.max_workers = max_workers
+
+    def get_output_params(self):
+        """Get the host.get output parameters from host_fields and inventory_fields"""
+        params = {
+            'output': 'extend',
+            'selectInventory': 'extend'
+        }
+        if self.host_fields:
+            params['output'] = ['hostid', 'name'] + [x for x in self.host_fields if x not in ('hostid', 'name')]
+        if self.inventory_fields:
+            params['selectInventory'] = self.inventory_fields
+        return params
+
+    def get_scope_params(self, host_groups=None, templates=None, tags=None, inventory_search=None):
+        """Get the host.get filter parameters to narrow the hosts on the server side"""
+        params = {}
+        if host_groups:
+            params['groupids'] = get_ids_by_names(self._zapi.hostgroup, 'groupid', 'name', host_groups)
+        if templates:
+            params['templateids'] = get_ids_by_names(self._zapi.template, 'templateid', 'host', templates)
+        if tags:
+            params['tags'] = [{
+                'tag': x['tag'],
+                'value': x.get('value') or '',
+                'operator': TAG_OPERATORS[x.get('operator') or 'like']
+            } for x in tags]
+        if inventory_search:
+            params['searchInventory'] = inventory_search
+        return params
+
+    def get_hosts(self, params):
+        """Get the hosts, page by page if page_size is set"""
+        if not self.page_size:
+            return self._zapi.host.get(params)
+
+        id_params = dict(params, output=['hostid'])
+        for key in [x for x in id_params if x.startswith('select')]:
+            id_params.pop(key)
+        host_ids = sorted((x['hostid'] for x in self._zapi.host.get(id_params)), key=int)
+        pages = [host_ids[i:i + self.page_size] for i in range(0, len(host_ids), self.page_size)]
+
+        host_list = []
+        for hosts in self.get_pages(params, pages):
+            host_list.extend(hosts)
+        return host_list
+
+    def get_pages(self, params, pages):
+        """Yield the hosts of each page in order, getting max_workers pages concurrently"""
+        def get_page(host_ids):
+            return self._zapi.host.get(dict(params, hostids=host_ids))
+
+        max_workers = min(self.max_workers, len(pages))
+        if max_workers <= 1:
+            for host_ids in pages:
+                yield get_page(host_ids)
+            return
+
+        pool = ThreadPool(processes=max_workers)
+        try:
+            for hosts in pool.imap(get_page, pages):
+                yield hosts
+        finally:
+            pool.close()
+            pool.join()
+
+    def get_host_ids_by_host_ip(self, host_ips):
+        """Get the host IDs of the interface IPs with a single hostinterface.get call"""
+        interfaces = self._zapi.hostinterface.get({
+            'output': ['hostid', 'ip'],
+            'filter': {
+                'ip': host_ips
+            }
+        })
+
+        host_ids = []
+        found_ips = set()
+        for interface in interfaces:
+            if interface['hostid'] not in host_ids:
+                host_ids.append(interface['hostid'])
+            found_ips.add(interface['ip'])
+        return host_ids, [x for x in host_ips if x not in found_ips]
+
+    @staticmethod
+    def delete_duplicate_hosts(hosts):
+        """ Delete duplicated hosts """
+        unique_hosts = []
+        listed_hostnames = set()
+        for zabbix_host in hosts:
+            if zabbix_host['name'] in listed_hostnames:
+                continue
+            unique_hosts.append(zabbix_host)
+            listed_hostnames.add(zabbix_host['name'])
+        return unique_hosts
+
+
+def zabbix_argument_spec():
+    """The connection options shared by the Zabbix modules"""
+    return dict(
+        server_url=dict(type='str', aliases=['url']),
+        login_user=dict(type='str'),
+        login_password=dict(type='str', no_log=True),
+        http_login_user=dict(type='str', required=False, default=None),
+        http_login_password=dict(type='str', required=False, default=None, no_log=True),
+        validate_certs=dict(type='bool', required=False, default=True),
+        timeout=dict(type='int', default=10)
+    )
+
+
+def read_json_state(path, selector, default=None):
+    """Read the JSON state file, starting over with the default if it is unreadable or the selector was changed"""
+    try:
+        with open(path, 'r') as f:
+            state = json.load(f)
+        if state.get('selector') == selector:
+            return state
+    except (IOError, OSError, ValueError):
+        pass
+    return dict(default or {}, selector=selector)
+
+
+def write_json_state(module, path, state):
+    """Write the JSON state file atomically, removing the temporary file if it fails"""
+    state_dir = os.path.dirname(os.path.abspath(path))
+    try:
+        if not os.path.isdir(state_dir):
+            os.makedirs(state_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=state_dir)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f)
+            os.rename(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    except (IOError, OSError) as e:
+        module.fail_json(msg="Failed to write %s: %s" % (path, e))
+
+
+def use_httpapi_connection(module):
+    """Whether the module runs on the persistent httpapi connection"""
+    return bool(getattr(module, '_socket_path', None))
+
+
+def check_login_params(module):
+    """Check the login parameters required without the httpapi connection"""
+    if use_httpapi_connection(module):
+        return
+
+    missing = [x for x in ('server_url', 'login_user', 'login_password') if not module.params[x]]
+    if missing:
+        module.fail_json(msg="missing required arguments: %s" % ", ".join(missing))
+
+
+def connect_to_zabbix(module):
+    """Get the Zabbix API client, reusing the login of the httpapi connection if it is used"""
+    check_login_params(module)
+    if use_httpapi_connection(module):
+        return ZabbixConnectionAPI(module)
+
+    if not HAS_REQUESTS:
+        module.fail_json(msg="requests library not found")
+
+    try:
+        zbx = ZabbixJsonRpcClient(module.params['server_url'], timeout=module.params['timeout'],
+                                  http_login_user=module.params['http_login_user'],
+                                  http_login_password=module.params['http_login_password'],
+                                  validate_certs=module.params['validate_certs'])
+        zbx.login(module.params['login_user'], module.params['login_password'])
+    except Exception as e:
+        module.fail_json(msg="Failed to connect to Zabbix server: %s" % e)
+
+    return zbx
@@ -47,7 +47,16 @@ options:
   name:
     description:
     - Specify a VM to powered on operation.
-    type: str
+    - If a list is specified, the VMs in the folder are powered on with one PowerOnMultiVM_Task of the datacenter,
+      the questions of all of them are answered from one property collector watch and the results are returned per VM.
+    - Required unless all_in_folder is set to C(True).
+    type: raw
+  all_in_folder:
+    description:
+    - If set to C(True), all the VMs in the folder are powered on like the list of name.
+    - Mutually exclusive with name.
+    default: False
+    type: bool
   answer:
     description:
     - If C(answer) is set to C(cancel), cancel answer.
@@ -64,6 +73,12 @@ options:
     choices: [ poweredon ]
     default: poweredon
     type: str
+  timeout:
+    description:
+    - Specify the seconds to wait for the virtual machine to be powered on.
+    - The power on task and the question are watched with the property collector, and the question is answered as soon as it is asked.
+    default: 600
+    type: int
 extends_documentation_fragment: vmware.documentation
 '''
 
@@ -77,6 +92,32 @@ EXAMPLES = '''
     name: "{{ vm_name }}"
     answer: moved
     state: poweredon
+
+- name: Power on all the copied VMs in the folder answering their questions
+  vmware_guest_powered_on_operation_question:
+    hostname: "{{ vcenter_hostname }}"
+    username: "{{ vcenter_username }}"
+    password: "{{ vcenter_password }}"
+    validate_certs: no
+    folder: /datacenter1/vm/copied
+    all_in_folder: yes
+    answer: copied
+    timeout: 1800
+'''
+
+RETURN = '''
+answered_questions:
+  description: List of the questions answered while powering on the virtual machine.
+  returned: when the virtual machine of name of a string is powered on
+  type: list
+  sample: [{"id": "_vmx1", "text": "This virtual machine might have been moved or copied. ...", "answer": "copied"}]
+virtual_machines:
+  description:
+  - Result of each VM, one of poweredOn, unchanged and failed, with the questions answered.
+  returned: when name is a list or all_in_folder is set to True
+  type: list
+  sample: [{"name": "vm01", "result": "poweredOn", "answered_questions": [{"id": "_vmx1", "text": "...", "answer": "copied"}]},
+           {"name": "vm02", "result": "unchanged", "answered_questions": []}]
 '''
 
 try:
@@ -85,8 +126,17 @@ try:
 except ImportError:
     HAS_PYVMOMI = False
 
-from ansible.module_utils.vmware import PyVmomi, vmware_argument_spec, find_vm_by_name
+from ansible.module_utils.vmware import PyVmomi, vmware_argument_spec, find_vm_by_name, get_parent_datacenter
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.six import string_types
+import time
+
+
+ANSWERS = {
+    "cancel": "0",
+    "moved": "1",
+    "copied": "2"
+}
 
 
 class VMwareGuestPoweredOnOperationQuestion(PyVmomi):
@@ -94,8 +144,234 @@ class VMwareGuestPoweredOnOperationQuestion(PyVmomi):
         super(VMwareGuestPoweredOnOperationQuestion, self).__init__(module)
         self.folder = module.params["folder"]
         self.name = module.params["name"]
+        self.all_in_folder = module.params["all_in_folder"]
         self.answer = module.params["answer"]
         self.state = module.params["state"]
+        self.timeout = module.params["timeout"]
+
+    def answer_question(self, vm_obj, question, answered_questions):
+        """Answer the question once, recording it to answered_questions
+
+        The error message is returned if the question can not be answered.
+        """
+        if question.id in [x['id'] for x in answered_questions]:
+            return None
+
+        choice_keys = [x.key for x in question.choice.choiceInfo]
+        if ANSWERS[self.answer] not in choice_keys:
+            return "%s can not be answered to the question: %s" % (self.answer, question.text)
+
+        try:
+            vm_obj.AnswerVM(question.id, ANSWERS[self.answer])
+        except Exception as e:
+            return "%s" % e
+        answered_questions.append(dict(id=question.id, text=question.text, answer=self.answer))
+        return None
+
+    def create_filter(self, property_collector, tasks, vm_objs):
+        """Create the filter reporting the changes of the states of the tasks and the questions of the VMs"""
+        filter_spec = vmodl.query.PropertyCollector.FilterSpec(
+            objectSet=[vmodl.query.PropertyCollector.ObjectSpec(obj=x) for x in list(tasks) + list(vm_objs)],
+            propSet=[vmodl.query.PropertyCollector.PropertySpec(type=vim.Task,
+                                                                pathSet=['info.state', 'info.error']),
+                     vmodl.query.PropertyCollector.PropertySpec(type=vim.VirtualMachine,
+                                                                pathSet=['runtime.question'])])
+        return property_collector.CreateFilter(filter_spec, True)
+
+    def wait_for_power_on(self, task, vm_obj):
+        """Wait for the power on task, answering the question of the VM as soon as it is asked
+
+        The changes are pushed by the property collector with WaitForUpdatesEx,
+        so vCenter is not polled while nothing changes.
+        """
+        property_collector = self.content.propertyCollector.CreatePropertyCollector()
+        try:
+            self.create_filter(property_collector, [task], [vm_obj])
+
+            answered_questions = []
+            task_state = None
+            task_error = None
+            version = ''
+            deadline = time.time() + self.timeout
+            while task_state not in [vim.TaskInfo.State.success, vim.TaskInfo.State.error]:
+                remaining = int(deadline - time.time())
+                if remaining <= 0:
+                    self.module.fail_json(msg="Timed out waiting for %s to be powered on." % self.name,
+                                          answered_questions=answered_questions)
+
+                options = vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=remaining)
+                update_set = property_collector.WaitForUpdatesEx(version, options)
+                if update_set is None:
+                    continue
+                version = update_set.version
+
+                for filter_set in update_set.filterSet:
+                    for object_set in filter_set.objectSet:
+                        for change in object_set.changeSet:
+                            if change.name == 'info.state':
+                                task_state = change.val
+                            elif change.name == 'info.error':
+                                task_error = change.val
+                            elif change.name == 'runtime.question' and change.val is not None:
+                                error = self.answer_question(vm_obj, change.val, answered_questions)
+                                if error:
+                                    self.module.fail_json(msg=error, answered_questions=answered_questions)
+        finally:
+            property_collector.Destroy()
+
+        if task_state == vim.TaskInfo.State.error:
+            self.module.fail_json(msg="Failed to power on %s: %s" % (self.name, task_error.msg if task_error else ''),
+                                  answered_questions=answered_questions)
+        return answered_questions
+
+    def get_vms_in_folder(self, folder_obj):
+        """Get the VMs in the folder with their names and power states by one RetrieveContents"""
+        view = self.content.viewManager.CreateContainerView(folder_obj, [vim.VirtualMachine], True)
+        try:
+            traversal_spec = vmodl.query.PropertyCollector.TraversalSpec(name='traversal_spec', path='view',
+                                                                         skip=False, type=vim.view.ContainerView)
+            filter_spec = vmodl.query.PropertyCollector.FilterSpec(
+                objectSet=[vmodl.query.PropertyCollector.ObjectSpec(obj=view, skip=True, selectSet=[traversal_spec])],
+                propSet=[vmodl.query.PropertyCollector.PropertySpec(type=vim.VirtualMachine,
+                                                                    pathSet=['name', 'runtime.powerState'])])
+            contents = self.content.propertyCollector.RetrieveContents([filter_spec])
+        finally:
+            view.Destroy()
+
+        vms = []
+        for content in contents:
+            properties = dict((x.name, x.val) for x in content.propSet)
+            vms.append(dict(obj=content.obj, name=properties.get('name'),
+                            power_state=properties.get('runtime.powerState')))
+        return vms
+
+    def wait_for_multi_power_on(self, task, vms, results):
+        """Wait for the power on of the VMs, answering their questions as soon as they are asked
+
+        The datacenter task, the power on tasks of the VMs given by its result and all the VMs
+        are watched by one property collector. A VM is powered on when its own power on task succeeds.
+        """
+        vm_objs = dict((x['obj']._moId, x['obj']) for x in vms)
+        vm_ids_by_task_id = {}
+        property_collector = self.content.propertyCollector.CreatePropertyCollector()
+        try:
+            self.create_filter(property_collector, [task], vm_objs.values())
+
+            task_state = None
+            version = ''
+            deadline = time.time() + self.timeout
+            while task_state != vim.TaskInfo.State.error and \
+                    (task_state != vim.TaskInfo.State.success or any(x['result'] is None for x in results.values())):
+                remaining = int(deadline - time.time())
+                if remaining <= 0:
+                    break
+
+                options = vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=remaining)
+                update_set = property_collector.WaitForUpdatesEx(version, options)
+                if update_set is None:
+                    continue
+                version = update_set.version
+
+                for filter_set in update_set.filterSet:
+                    for object_set in filter_set.objectSet:
+                        object_id = object_set.obj._moId
+                        changes = dict((x.name, x.val) for x in object_set.changeSet)
+
+                        if object_id == task._moId:
+                            if changes.get('info.state') == vim.TaskInfo.State.error:
+                                task_state = vim.TaskInfo.State.error
+                                error = changes.get('info.error')
+                                for vm_result in results.values():
+                                    if vm_result['result'] is None:
+                                        vm_result.update(result='failed', msg=error.msg if error else '')
+                            elif changes.get('info.state') == vim.TaskInfo.State.success:
+                                task_state = vim.TaskInfo.State.success
+                                vm_ids_by_task_id = self.watch_attempted_tasks(property_collector, task, results)
+
+                        elif object_id in vm_ids_by_task_id:
+                            vm_result = results[vm_ids_by_task_id[object_id]]
+                            if vm_result['result'] is not None:
+                                continue
+                            if changes.get('info.state') == vim.TaskInfo.State.error:
+                                error = changes.get('info.error')
+                                vm_result.update(result='failed', msg=error.msg if error else '')
+                            elif changes.get('info.state') == vim.TaskInfo.State.success:
+                                vm_result['result'] = 'poweredOn'
+
+                        elif object_id in results:
+                            vm_result = results[object_id]
+                            question = changes.get('runtime.question')
+                            if question is not None and vm_result['result'] is None:
+                                error = self.answer_question(vm_objs[object_id], question,
+                                                             vm_result['answered_questions'])
+                                if error:
+                                    vm_result.update(result='failed', msg=error)
+        finally:
+            property_collector.Destroy()
+
+        for vm_result in results.values():
+            if vm_result['result'] is None:
+                vm_result.update(result='failed', msg="Timed out waiting for the virtual machine to be powered on.")
+
+    def watch_attempted_tasks(self, property_collector, task, results):
+        """Watch the power on tasks of the VMs attempted by the datacenter task
+
+        The VMs not attempted and the VMs attempted without a task, like by the DRS recommendations
+        in the manual mode, are failed at once.
+        """
+        task_result = task.info.result
+        for not_attempted in task_result.notAttempted:
+            vm_result = results.get(not_attempted.vm._moId)
+            if vm_result is not None and vm_result['result'] is None:
+                vm_result.update(result='failed', msg=not_attempted.fault.localizedMessage)
+        for attempted in task_result.attempted:
+            vm_result = results.get(attempted.vm._moId)
+            if attempted.task is None and vm_result is not None and vm_result['result'] is None:
+                vm_result.update(result='failed', msg="No power on task was created, DRS returned recommendations instead.")
+
+        vm_ids_by_task_id = dict((x.task._moId, x.vm._moId) for x in task_result.attempted if x.task is not None)
+        if vm_ids_by_task_id:
+            self.create_filter(property_collector, [x.task for x in task_result.attempted if x.task is not None], [])
+        return vm_ids_by_task_id
+
+    def execute_multi(self, folder_obj):
+        """Power on the VMs of name or all the VMs in the folder with one datacenter call"""
+        vms = self.get_vms_in_folder(folder_obj)
+        if not self.all_in_folder:
+            vms_by_name = dict((x['name'], x) for x in vms)
+            missing = [x for x in self.name if x not in vms_by_name]
+            if missing:
+                self.module.fail_json(msg="vm %s not found." % ", ".join(missing))
+            vms = [vms_by_name[x] for x in self.name]
+
+        results = dict((x['obj']._moId, dict(name=x['name'], result=None, answered_questions=[])) for x in vms)
+        powered_off_vms = []
+        for vm in vms:
+            if vm['power_state'] == 'poweredOff':
+                powered_off_vms.append(vm)
+            else:
+                results[vm['obj']._moId]['result'] = 'unchanged'
+
+        if powered_off_vms:
+            if self.module.check_mode:
+                for vm in powered_off_vms:
+                    results[vm['obj']._moId]['result'] = 'poweredOn'
+            else:
+                datacenter_obj = get_parent_datacenter(folder_obj)
+                try:
+                    task = datacenter_obj.PowerOnMultiVM_Task(vm=[x['obj'] for x in powered_off_vms])
+                except Exception as e:
+                    self.module.fail_json(msg="%s" % e)
+                self.wait_for_multi_power_on(task, powered_off_vms, results)
+
+        result = dict(
+            changed=any(x['result'] == 'poweredOn' for x in results.values()),
+            virtual_machines=[results[x['obj']._moId] for x in vms]
+        )
+        failed = [x['name'] for x in result['virtual_machines'] if x['result'] == 'failed']
+        if failed:
+            self.module.fail_json(msg="Failed to power on %s." % ", ".join(failed), **result)
+        self.module.exit_json(**result)
 
     def execute(self):
         result = dict(changed=False)
@@ -104,27 +380,20 @@ class VMwareGuestPoweredOnOperationQuestion(PyVmomi):
         if (not (folder_obj)):
             self.module.fail_json(msg="folder %s not found." % self.folder)
 
-        answers = {
-            "cancel": "0",
-            "moved": "1",
-            "copied": "2"
-        }
+        if self.all_in_folder or isinstance(self.name, list):
+            self.execute_multi(folder_obj)
 
         vm_obj = find_vm_by_name(self.content, self.name, folder=folder_obj)
-        if(vm_obj.runtime.powerState == "poweredOff"):
-            task = vm_obj.PowerOn()
-            while task.info.state not in [vim.TaskInfo.State.success,
-                                          vim.TaskInfo.State.error]:
-
-                if vm_obj.runtime.question is not None:
-                    question_id = vm_obj.runtime.question.id
-                    if question_id not in answers.keys():
-                        try:
-                            vm_obj.AnswerVM(question_id, answers[self.answer])
-                        except Exception as e:
-                            self.module.fail_json(msg="%s" % e)
+        if not vm_obj:
+            self.module.fail_json(msg="vm %s not found." % self.name)
 
+        if(vm_obj.runtime.powerState == "poweredOff"):
             result.update(changed=True)
+            if self.module.check_mode:
+                self.module.exit_json(**result)
+
+            task = vm_obj.PowerOn()
+            result.update(answered_questions=self.wait_for_power_on(task, vm_obj))
             self.module.exit_json(**result)
 
         self.module.exit_json(**result)
@@ -133,14 +402,23 @@ class VMwareGuestPoweredOnOperationQuestion(PyVmomi):
 def main():
     argument_spec = vmware_argument_spec()
     argument_spec.update(folder=dict(type="str", default="/ha-datacenter/vm"),
-                         name=dict(type="str", required=True),
+                         name=dict(type="raw"),
+                         all_in_folder=dict(type="bool", default=False),
                          answer=dict(type="str", choices=["cancel", "moved", "copied"], default="copied"),
                          state=dict(type="str", choices=["poweredon"], default="poweredon"),
+                         timeout=dict(type="int", default=600),
                          )
 
     module = AnsibleModule(argument_spec=argument_spec,
                            supports_check_mode=True)
 
+    if module.params['name'] is None and not module.params['all_in_folder']:
+        module.fail_json(msg="one of the following is required: name, all_in_folder")
+    if module.params['name'] and module.params['all_in_folder']:
+        module.fail_json(msg="parameters are mutually exclusive: name|all_in_folder")
+    if module.params['name'] is not None and not isinstance(module.params['name'], (string_types, list)):
+        module.fail_json(msg="name must be a string or a list of strings.")
+
     vmware_guest_powere_question = VMwareGuestPoweredOnOperationQuestion(module)
     vmware_guest_powere_question.execute()
 
@@ -24,7 +24,8 @@ description:
     - Return basic facts pertaining to a vSphere virtual machine guest.
 requirements:
     - python >= 2.6
-    - vSphere Automation SDK
+    - vSphere Automation SDK (transport is sdk)
+    - requests (transport is rest)
 options:
     hostname:
       description:
@@ -46,11 +47,100 @@ options:
       choices:
         - https
         - http
+    transport:
+      description:
+        - If C(transport) is set to C(sdk), use the vSphere Automation SDK.
+        - If C(transport) is set to C(rest), send the requests to the vCenter REST API directly with a pooled HTTP session.
+          The vSphere Automation SDK is not imported, so the module starts faster and uses less memory.
+        - The VM information returned is the same with either transport.
+      choices: [ sdk, rest ]
+      default: sdk
+      type: str
     name:
       description:
-        - The virtual machine name.
+        - The virtual machine name or list of the virtual machine names.
+        - If a list is specified, the VMs are listed with a single call and the VM information is returned keyed by name.
+          All the names not found are reported together.
         - If name is not specified, all the VM information is returned
+      type: raw
+    max_workers:
+      description:
+        - Number of threads used to get the information of several VMs concurrently.
+        - All threads share the same vSphere session.
+      default: 10
+      type: int
+    names:
+      description:
+        - List of VM names to filter on vCenter.
+        - Mutually exclusive with name.
+        - Use name to get the VM information keyed by name.
+      type: list
+    folders:
+      description:
+        - List of folder names to filter on vCenter.
+      type: list
+    datacenters:
+      description:
+        - List of datacenter names to filter on vCenter.
+      type: list
+    clusters:
+      description:
+        - List of cluster names to filter on vCenter.
+      type: list
+    hosts:
+      description:
+        - List of ESXi host names to filter on vCenter.
+      type: list
+    resource_pools:
+      description:
+        - List of resource pool names to filter on vCenter.
+      type: list
+    power_states:
+      description:
+        - List of power states to filter on vCenter.
+      choices: [ POWERED_ON, POWERED_OFF, SUSPENDED ]
+      type: list
+    detail:
+      description:
+        - If C(detail) is set to C(summary), return only vm, name, power_state, cpu_count and memory_size_MiB.
+          The summary is returned by the list call, so the per-VM get calls are skipped.
+        - If C(detail) is set to C(full), return all the VM information.
+      choices: [ summary, full ]
+      default: full
+      type: str
+    properties:
+      description:
+        - List of properties to return for each VM.
+        - Nested properties can be specified with dot notation, for example C(hardware.version).
+        - If not specified, all the properties are returned.
+      type: list
+    cache_dir:
+      description:
+        - Directory to cache the VM information on the host running the module.
+        - The cache is keyed by hostname, username, name, filter options and detail.
+        - If not specified, the cache is not used.
+      type: path
+    cache_ttl:
+      description:
+        - Number of seconds the cached VM information is returned without connecting to vCenter.
+      default: 300
+      type: int
+    cache_mode:
+      description:
+        - If C(cache_mode) is set to C(ttl), all the VM information is got again when the cache expires.
+        - If C(cache_mode) is set to C(incremental), the VM summaries are listed again when the cache expires
+          and only the VMs whose summary changed or that are new are got again.
+        - In C(incremental) mode, changes that do not appear in the summary, such as disk or NIC changes, are not detected.
+          Remove the cache file to force a full refresh.
+      choices: [ ttl, incremental ]
+      default: ttl
       type: str
+    output_file:
+      description:
+        - Path of a JSON Lines file to write the VM information to, one VM per line, on the host running the module.
+        - The VM information is written as each VM is got and is not returned, only the path and counts are returned.
+        - When cache_dir is also specified, the VM information is kept in memory to update the cache.
+      type: path
 extends_documentation_fragment: vmware_rest_client.documentation
 '''
 
@@ -69,6 +159,21 @@ EXAMPLES = '''
         name: devel
       register: r
 
+- name: Get the facts of several vm.
+  hosts: localhost
+  gather_facts: no
+  tasks:
+    - vmware_rest_vm_facts:
+        hostname: vcenter.local
+        username: administrator@vsphere.local
+        password: secret
+        validate_certs: no
+        protocol: https
+        name:
+          - devel
+          - staging
+      register: r
+
 - name: Get all vm facts.
   hosts: localhost
   gather_facts: no
@@ -80,50 +185,570 @@ EXAMPLES = '''
         validate_certs: no
         protocol: https
       register: r
+
+- name: Get all vm facts with 20 threads.
+  hosts: localhost
+  gather_facts: no
+  tasks:
+    - vmware_rest_vm_facts:
+        hostname: vcenter.local
+        username: administrator@vsphere.local
+        password: secret
+        validate_certs: no
+        protocol: https
+        max_workers: 20
+      register: r
+
+- name: Get the facts of powered on vm in the cluster.
+  hosts: localhost
+  gather_facts: no
+  tasks:
+    - vmware_rest_vm_facts:
+        hostname: vcenter.local
+        username: administrator@vsphere.local
+        password: secret
+        validate_certs: no
+        protocol: https
+        clusters:
+          - Cluster01
+        power_states:
+          - POWERED_ON
+      register: r
+
+- name: Get the name and power state of all vm without the per-VM get calls.
+  hosts: localhost
+  gather_facts: no
+  tasks:
+    - vmware_rest_vm_facts:
+        hostname: vcenter.local
+        username: administrator@vsphere.local
+        password: secret
+        validate_certs: no
+        protocol: https
+        detail: summary
+        properties:
+          - name
+          - power_state
+      register: r
+
+- name: Get all vm facts using the cache refreshed incrementally.
+  hosts: localhost
+  gather_facts: no
+  tasks:
+    - vmware_rest_vm_facts:
+        hostname: vcenter.local
+        username: administrator@vsphere.local
+        password: secret
+        validate_certs: no
+        protocol: https
+        cache_dir: /tmp/vmware_rest_vm_facts
+        cache_ttl: 600
+        cache_mode: incremental
+      register: r
+
+- name: Write all vm facts to a JSON Lines file.
+  hosts: localhost
+  gather_facts: no
+  tasks:
+    - vmware_rest_vm_facts:
+        hostname: vcenter.local
+        username: administrator@vsphere.local
+        password: secret
+        validate_certs: no
+        protocol: https
+        output_file: /tmp/virtual_machines.jsonl
+      register: r
+
+- name: Get all vm facts without the vSphere Automation SDK.
+  hosts: localhost
+  gather_facts: no
+  tasks:
+    - vmware_rest_vm_facts:
+        hostname: vcenter.local
+        username: administrator@vsphere.local
+        password: secret
+        validate_certs: no
+        protocol: https
+        transport: rest
+      register: r
 '''
 
-from ansible.module_utils.vmware_rest_client import VmwareRestClient
-from ansible.module_utils.basic import AnsibleModule
+RETURN = '''
+virtual_machines:
+  description:
+    - The VM information.
+    - A dict when name is a string, a dict keyed by name when name is a list, otherwise a list.
+    - Each VM has the VM information of vCenter selected by detail and properties.
+  returned: when output_file is not specified
+  type: complex
+  contains:
+    name:
+      description: Name of the VM.
+      type: str
+      sample: devel
+    power_state:
+      description: Power state of the VM.
+      type: str
+      sample: POWERED_ON
+failed_virtual_machines:
+  description: List of VMs whose information could not be got, with the error message.
+  returned: when name is not a string or output_file is specified
+  type: list
+  sample: [{"vm": "vm-1001", "name": "devel", "msg": "Unable to authorize user"}]
+missing_names:
+  description: List of the names not found in vCenter.
+  returned: when name is specified and some names are not found
+  type: list
+  sample: ["staging"]
+cache_hit:
+  description: Whether the VM information was returned from the cache without connecting to vCenter.
+  returned: when cache_dir is specified
+  type: bool
+output_file:
+  description: The path of the JSON Lines file.
+  returned: when output_file is specified
+  type: str
+  sample: /tmp/virtual_machines.jsonl
+virtual_machines_count:
+  description: Number of VMs written to the JSON Lines file.
+  returned: when output_file is specified
+  type: int
+  sample: 8000
+'''
+
+from ansible.module_utils.basic import AnsibleModule, env_fallback
+from multiprocessing.pool import ThreadPool
+import hashlib
+import json
+import os
+import tempfile
+import time
+
 try:
-    from com.vmware import vcenter_client
+    import requests
+    from requests.adapters import HTTPAdapter
+    from requests.packages.urllib3.exceptions import InsecureRequestWarning
+    requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+    HAS_REQUESTS = True
 except ImportError:
-    pass
+    HAS_REQUESTS = False
+
+# Filter option: (vcenter_client service, summary id attribute, REST API path)
+FILTER_OBJECTS = {
+    "folders": ("Folder", "folder", "folder"),
+    "datacenters": ("Datacenter", "datacenter", "datacenter"),
+    "clusters": ("Cluster", "cluster", "cluster"),
+    "hosts": ("Host", "host", "host"),
+    "resource_pools": ("ResourcePool", "resource_pool", "resource-pool"),
+}
+
+# The REST API returns these VM.Info maps as lists of key/value pairs.
+VM_INFO_MAPS = ("cdroms", "disks", "floppies", "nics", "parallel_ports", "serial_ports", "sata_adapters", "scsi_adapters")
+
+
+class VmwareSdkTransport(object):
+    """Get the VM information with the vSphere Automation SDK"""
+    def __init__(self, module):
+        # The SDK is imported here so that the rest transport does not load it.
+        from ansible.module_utils.vmware_rest_client import VmwareRestClient
+        from com.vmware import vcenter_client
+        from com.vmware.vcenter.vm_client import Power
+
+        self.module = module
+        self.vcenter_client = vcenter_client
+        self.power = Power
+        self.stub_config = VmwareRestClient(module).connect
+        self.vm_svc = vcenter_client.VM(self.stub_config)
+
+    def get_object_ids(self, option, names):
+        """Convert the object names to the identifiers with a single list call"""
+        service_name, id_attr, path = FILTER_OBJECTS[option]
+        service = getattr(self.vcenter_client, service_name)
+        summaries = service(self.stub_config).list(service.FilterSpec(names=set(names)))
+        return [(getattr(x, id_attr), x.name) for x in summaries]
+
+    def list_vms(self, vm_filter):
+        spec = self.vcenter_client.VM.FilterSpec()
+        for key, values in vm_filter.items():
+            if(key == "power_states"):
+                values = [self.power.State(x) for x in values]
+            setattr(spec, key, set(values))
+        return list(map(lambda x: x.to_dict(), self.vm_svc.list(spec)))
+
+    def get_vm(self, vm_id):
+        return self.vm_svc.get(vm_id).to_dict()
+
+    def close(self):
+        pass
+
+
+class VmwareRestTransport(object):
+    """Get the VM information from the vCenter REST API with a pooled HTTP session"""
+    def __init__(self, module):
+        self.module = module
+        self.base_url = "%s://%s/rest" % (module.params["protocol"], module.params["hostname"])
+        self.session = requests.Session()
+        self.session.verify = module.params["validate_certs"]
+        self.session.mount("%s://" % module.params["protocol"],
+                           HTTPAdapter(pool_connections=1, pool_maxsize=module.params["max_workers"]))
+
+        r = self.session.post(self.base_url + "/com/vmware/cis/session",
+                              auth=(module.params["username"], module.params["password"]))
+        if(r.status_code != 200):
+            raise Exception("Failed to login to %s: %s %s" % (module.params["hostname"], r.status_code, r.text))
+        self.session.headers["vmware-api-session-id"] = r.json()["value"]
+
+    def _get(self, path, params=None):
+        r = self.session.get(self.base_url + path, params=params)
+        if(r.status_code != 200):
+            raise Exception("GET %s failed: %s %s" % (path, r.status_code, r.text))
+        return r.json()["value"]
+
+    def get_object_ids(self, option, names):
+        """Convert the object names to the identifiers with a single list call"""
+        service_name, id_attr, path = FILTER_OBJECTS[option]
+        summaries = self._get("/vcenter/%s" % path, params={"filter.names": names})
+        return [(x[id_attr], x["name"]) for x in summaries]
+
+    def list_vms(self, vm_filter):
+        params = dict(("filter.%s" % key, list(values)) for key, values in vm_filter.items())
+        return self._get("/vcenter/vm", params=params)
+
+    def get_vm(self, vm_id):
+        vm_info = self._get("/vcenter/vm/%s" % vm_id)
+        for key in VM_INFO_MAPS:
+            if(key in vm_info):
+                vm_info[key] = dict((x["key"], x["value"]) for x in vm_info[key])
+        return vm_info
+
+    def close(self):
+        try:
+            self.session.delete(self.base_url + "/com/vmware/cis/session")
+        except Exception:
+            pass
+        self.session.close()
+
+
+def vmware_rest_argument_spec():
+    """Same options as VmwareRestClient.vmware_client_argument_spec without importing the SDK"""
+    return dict(
+        hostname=dict(type='str', fallback=(env_fallback, ['VMWARE_HOST'])),
+        username=dict(type='str', fallback=(env_fallback, ['VMWARE_USER']), aliases=['user', 'admin']),
+        password=dict(type='str', fallback=(env_fallback, ['VMWARE_PASSWORD']), aliases=['pass', 'pwd'], no_log=True),
+        protocol=dict(type='str', default='https', choices=['https', 'http']),
+        validate_certs=dict(type='bool', fallback=(env_fallback, ['VMWARE_VALIDATE_CERTS']), default=True),
+    )
+
+
+def get_vm_detail(transport, vm_id):
+    """Get the VM information, returning the error instead of raising it"""
+    try:
+        return vm_id, transport.get_vm(vm_id), None
+    except Exception as e:
+        return vm_id, None, str(e)
+
+
+def get_vm_details(transport, vm_ids, max_workers):
+    """Get the VM information concurrently with a bounded thread pool, yielding each VM as it is got"""
+    if not vm_ids:
+        return
+
+    pool = ThreadPool(processes=max(1, min(max_workers, len(vm_ids))))
+    try:
+        for r in pool.imap_unordered(lambda vm_id: get_vm_detail(transport, vm_id), vm_ids):
+            yield r
+    finally:
+        pool.close()
+        pool.join()
+
+
+def fetch_vm_infos(module, transport, summaries, cached_details, details, failed):
+    """Yield (vm id, VM information) as each VM is got
+
+    The VM information is also stored to details unless it is None, and the errors are appended to failed.
+    """
+    if(module.params["detail"] == "summary"):
+        for summary in summaries:
+            yield summary["vm"], summary
+        return
+
+    names_by_id = dict((x["vm"], x["name"]) for x in summaries)
+    vm_ids = []
+    for summary in summaries:
+        vm_id = summary["vm"]
+        if(vm_id in cached_details):
+            if(details is not None):
+                details[vm_id] = cached_details[vm_id]
+            yield vm_id, cached_details[vm_id]
+        else:
+            vm_ids.append(vm_id)
+
+    for vm_id, vm_info, error in get_vm_details(transport, vm_ids, module.params["max_workers"]):
+        if(error):
+            failed.append(dict(vm=vm_id, name=names_by_id[vm_id], msg=error))
+        else:
+            if(details is not None):
+                details[vm_id] = vm_info
+            yield vm_id, vm_info
+
+
+def iter_cached_vm_infos(module, summaries, details):
+    """Yield (vm id, VM information) from the cache"""
+    for summary in summaries:
+        vm_id = summary["vm"]
+        if(module.params["detail"] == "summary"):
+            yield vm_id, summary
+        elif(vm_id in details):
+            yield vm_id, details[vm_id]
+
+
+def write_output_file(output_file, vms):
+    """Write the VM information to the JSON Lines file one by one, returning the count"""
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    if(not(os.path.isdir(output_dir))):
+        os.makedirs(output_dir)
+
+    count = 0
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir)
+    try:
+        with os.fdopen(fd, "w") as f:
+            for vm in vms:
+                f.write(json.dumps(vm))
+                f.write("\n")
+                count += 1
+        os.rename(tmp_path, output_file)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+    return count
+
+
+def project_properties(vm, properties):
+    """Trim the VM information to the specified properties"""
+    if not properties:
+        return vm
+
+    r = {}
+    for prop in properties:
+        keys = prop.split(".")
+        value = vm
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            dest = r
+            for key in keys[:-1]:
+                dest = dest.setdefault(key, {})
+            dest[keys[-1]] = value
+
+    return r
+
+
+def get_cache_path(module):
+    """Get the cache file path keyed by vCenter and filter"""
+    key_params = ["hostname", "protocol", "username", "name", "names", "detail"] + list(FILTER_OBJECTS) + ["power_states"]
+    key = json.dumps(dict((x, module.params.get(x)) for x in key_params), sort_keys=True)
+    file_name = "vmware_rest_vm_facts_%s.json" % hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(module.params["cache_dir"], file_name)
+
+
+def read_cache(cache_path):
+    """Read the cache file, returning None if it can not be used"""
+    try:
+        with open(cache_path, "r") as f:
+            cache = json.load(f)
+        if all(x in cache for x in ("timestamp", "summaries", "details")):
+            return cache
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+
+def write_cache(cache_path, summaries, details):
+    """Write the cache file atomically"""
+    cache_dir = os.path.dirname(cache_path)
+    if(not(os.path.isdir(cache_dir))):
+        os.makedirs(cache_dir)
+
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(dict(timestamp=time.time(), summaries=summaries, details=details), f)
+        os.rename(tmp_path, cache_path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def set_virtual_machines(module, result, summaries, vm_infos):
+    """Set the VM information to the result in the order of the summaries, or write it to output_file"""
+    vm_name = module.params["name"]
+    properties = module.params["properties"]
+    output_file = module.params["output_file"]
+
+    if(output_file):
+        try:
+            count = write_output_file(output_file, (project_properties(x, properties) for vm_id, x in vm_infos))
+        except (IOError, OSError) as e:
+            module.fail_json(msg="Failed to write %s: %s" % (output_file, e))
+        result["output_file"] = output_file
+        result["virtual_machines_count"] = count
+        return
+
+    vm_infos = dict(vm_infos)
+    vms = [(x["name"], project_properties(vm_infos[x["vm"]], properties)) for x in summaries if x["vm"] in vm_infos]
+    if(isinstance(vm_name, list)):
+        result["virtual_machines"] = dict(vms)
+    elif(vm_name):
+        if(vms):
+            result["virtual_machines"] = vms[0][1]
+    else:
+        result["virtual_machines"] = [x for name, x in vms]
+
+
+def exit_with_virtual_machines(module, result, summaries, failed):
+    """Report the failed and missing VMs and exit"""
+    vm_name = module.params["name"]
+
+    if(isinstance(vm_name, list) or not(vm_name) or module.params["output_file"]):
+        result["failed_virtual_machines"] = failed
+    elif(failed):
+        module.fail_json(msg=failed[0]["msg"])
+
+    if(vm_name):
+        names = vm_name if isinstance(vm_name, list) else [vm_name]
+        listed_names = set(x["name"] for x in summaries)
+        missing = [x for x in names if x not in listed_names]
+        if(missing):
+            result["missing_names"] = missing
+            module.fail_json(msg="%s not found." % ", ".join(missing), **result)
+
+    module.exit_json(**result)
+
+
+def get_vm_filter(module, transport, names=None):
+    """Create the VM filter from the module parameters"""
+    if(names is None):
+        names = module.params["names"]
+
+    vm_filter = {}
+    if(names):
+        vm_filter["names"] = names
+
+    for option in FILTER_OBJECTS:
+        if(module.params[option]):
+            objects = transport.get_object_ids(option, module.params[option])
+            found_names = set(name for object_id, name in objects)
+            missing = [x for x in module.params[option] if x not in found_names]
+            if(missing):
+                module.fail_json(msg="%s not found: %s" % (option, ", ".join(missing)))
+            vm_filter[option] = set(object_id for object_id, name in objects)
+
+    if(module.params["power_states"]):
+        vm_filter["power_states"] = module.params["power_states"]
+
+    return vm_filter
 
 
 def main():
     result = dict(changed=False)
-    argument_spec = VmwareRestClient.vmware_client_argument_spec()
-    argument_spec.update(name=dict(type="str"))
+    argument_spec = vmware_rest_argument_spec()
+    argument_spec.update(transport=dict(type="str", choices=["sdk", "rest"], default="sdk"),
+                         name=dict(type="raw"),
+                         max_workers=dict(type="int", default=10),
+                         names=dict(type="list"),
+                         folders=dict(type="list"),
+                         datacenters=dict(type="list"),
+                         clusters=dict(type="list"),
+                         hosts=dict(type="list"),
+                         resource_pools=dict(type="list"),
+                         power_states=dict(type="list", choices=["POWERED_ON", "POWERED_OFF", "SUSPENDED"]),
+                         detail=dict(type="str", choices=["summary", "full"], default="full"),
+                         properties=dict(type="list"),
+                         cache_dir=dict(type="path"),
+                         cache_ttl=dict(type="int", default=300),
+                         cache_mode=dict(type="str", choices=["ttl", "incremental"], default="ttl"),
+                         output_file=dict(type="path"))
 
     module = AnsibleModule(argument_spec=argument_spec,
+                           mutually_exclusive=[["name", "names"]],
                            supports_check_mode=True)
 
+    if module.params["max_workers"] < 1:
+        module.fail_json(msg="max_workers must be greater than 0.")
+
+    if module.params["transport"] == "rest" and not HAS_REQUESTS:
+        module.fail_json(msg="requests library not found")
+
+    cache = None
+    cache_path = None
+    if(module.params["cache_dir"]):
+        cache_path = get_cache_path(module)
+        cache = read_cache(cache_path)
+        result["cache_hit"] = False
+        if(cache and time.time() - cache["timestamp"] < module.params["cache_ttl"]):
+            result["cache_hit"] = True
+            summaries = cache["summaries"]
+            set_virtual_machines(module, result, summaries, iter_cached_vm_infos(module, summaries, cache["details"]))
+            exit_with_virtual_machines(module, result, summaries, [])
+
     try:
-        obj = VmwareRestClient(module)
-        vm_svc = vcenter_client.VM(obj.connect)
+        if(module.params["transport"] == "rest"):
+            transport = VmwareRestTransport(module)
+        else:
+            transport = VmwareSdkTransport(module)
     except Exception as e:
         module.fail_json(msg=str(e))
 
     vm_name = module.params["name"]
-    if(vm_name):
-        names = set([vm_name])
-        vm = vm_svc.list(vcenter_client.VM.FilterSpec(names=names))
-        r = list(map(lambda x: x.to_dict(), vm))
-        if(len(r) > 0):
-            result["virtual_machines"] = vm_svc.get(r[0]["vm"]).to_dict()
-            module.exit_json(**result)
+    try:
+        if(isinstance(vm_name, list)):
+            vm_filter = get_vm_filter(module, transport, names=vm_name)
+        elif(vm_name):
+            vm_filter = get_vm_filter(module, transport, names=[vm_name])
         else:
-            module.fail_json(msg="%s not found." % vm_name)
-    else:
-        vms = vm_svc.list()
-        r = list(map(lambda x: x.to_dict(), vms))
+            vm_filter = get_vm_filter(module, transport)
+        summaries = transport.list_vms(vm_filter)
+    except Exception as e:
+        module.fail_json(msg=str(e))
+
+    if(vm_name):
+        # Names are not unique in vCenter, so use the first VM found for each name.
+        listed_names = set()
+        unique_summaries = []
+        for summary in summaries:
+            if(summary["name"] not in listed_names):
+                unique_summaries.append(summary)
+                listed_names.add(summary["name"])
+        summaries = unique_summaries
+
+    cached_details = {}
+    if(cache and module.params["cache_mode"] == "incremental"):
+        cached_summaries = dict((x["vm"], x) for x in cache["summaries"])
+        for summary in summaries:
+            vm_id = summary["vm"]
+            if(cached_summaries.get(vm_id) == summary and vm_id in cache["details"]):
+                cached_details[vm_id] = cache["details"][vm_id]
+
+    # Keep the VM information for the cache, output_file alone does not hold it in memory.
+    details = None
+    if(module.params["detail"] == "full" and cache_path):
+        details = {}
+
+    failed = []
+    vm_infos = fetch_vm_infos(module, transport, summaries, cached_details, details, failed)
+    set_virtual_machines(module, result, summaries, vm_infos)
+    transport.close()
 
-        r_array = []
-        for vm in r:
-            r_array.append(vm_svc.get(vm["vm"]).to_dict())
+    if(cache_path and not(failed)):
+        try:
+            write_cache(cache_path, summaries, details or {})
+        except (IOError, OSError) as e:
+            module.warn("Failed to write the cache %s: %s" % (cache_path, e))
 
-        result["virtual_machines"] = r_array
-        module.exit_json(**result)
+    exit_with_virtual_machines(module, result, summaries, failed)
 
 
 if __name__ == "__main__":
@@ -81,12 +81,19 @@ options:
         description:
             - The absolute path to the program to start.
             - On Linux, shell is executed via bash.
-        required: True
+            - The process is found by the command line containing vm_shell and vm_shell_args in this order.
+            - Required unless pid is specified.
         type: str
     vm_shell_args:
         description:
             - The argument to the program.
         type: str
+    pid:
+        description:
+            - The process ID returned by vmware_vm_shell.
+            - If specified, only the process of the pid is got on each check instead of all the processes in the guest,
+              and vm_shell and vm_shell_args are not used to find the process.
+        type: int
     check_interval:
         description:
             - Specify the process check interval in seconds.
@@ -140,6 +147,30 @@ EXAMPLES = '''
     vm_shell: /root/loop.sh
     vm_shell_args: 5
     time_out: 3
+
+# Wait for the process started by vmware_vm_shell.
+- vmware_vm_shell:
+    hostname: vCenter or ESXi
+    username: username
+    password: secret
+    validate_certs: no
+    vm_id: devel # myVMName
+    vm_username: root
+    vm_password: secret
+    vm_shell: /root/loop.sh
+    vm_shell_args: 5
+    wait_for_process: no
+  register: shell_result
+
+- vmware_vm_shell_wait:
+    hostname: vCenter or ESXi
+    username: username
+    password: secret
+    validate_certs: no
+    vm_id: devel # myVMName
+    vm_username: root
+    vm_password: secret
+    pid: "{{ shell_result.msg }}"
 '''
 
 try:
@@ -166,6 +197,7 @@ class VMwareVMShellCheck():
         self.vm_password = module.params["vm_password"]
         self.vm_shell = module.params["vm_shell"]
         self.vm_shell_args = module.params["vm_shell_args"]
+        self.pid = module.params["pid"]
         self.check_interval = module.params["check_interval"]
         self.time_out = module.params["time_out"]
         self.content = connect_to_api(module)
@@ -183,7 +215,7 @@ class VMwareVMShellCheck():
 
         cluster = None
         if self.cluster_name:
-            cluster = find_cluster_by_name(self.content, self.cluster_name, self.datacenter)
+            cluster = find_cluster_by_name(self.content, self.cluster_name, datacenter)
             if not cluster:
                 self.module.fail_json(changed=False, msg="Unable to find %(cluster)s cluster" % self.module.params)
 
@@ -196,16 +228,32 @@ class VMwareVMShellCheck():
             guest_auth = vim.vm.guest.NamePasswordAuthentication()
             guest_auth.username = self.vm_username
             guest_auth.password = self.vm_password
+
+            # Only the process of pid is listed if pid is specified,
+            # otherwise the processes are matched by the command line.
+            pids = None
+            cmd_line_pattern = None
+            if self.pid is not None:
+                pids = [self.pid]
+            else:
+                cmd_line_pattern = re.compile(r'%s.*%s' % (re.escape(self.vm_shell), re.escape(self.vm_shell_args or '')))
+
             while True:
                 try:
                     r = self.content.guestOperationsManager.processManager.ListProcessesInGuest(
                         vm=vm,
-                        auth=guest_auth
+                        auth=guest_auth,
+                        pids=pids
                     )
                 except Exception as e:
                     self.module.fail_json(msg=str(e))
 
-                pid_num = [x for x in r if (re.search(r'%s.*%s' % (self.vm_shell, self.vm_shell_args), x.cmdLine))]
+                if pids:
+                    pid_num = [x for x in r if x.pid == self.pid]
+                    if not pid_num:
+                        self.module.fail_json(msg="Process %s not found" % self.pid)
+                else:
+                    pid_num = [x for x in r if cmd_line_pattern.search(x.cmdLine)]
                 if (pid_num):
                     exitCode = pid_num.pop().exitCode
                     if (isinstance(exitCode, int)):
@@ -234,12 +282,14 @@ def main():
                          vm_id_type=dict(default='vm_name', type='str', choices=['inventory_path', 'uuid', 'dns_name', 'vm_name']),
                          vm_username=dict(required=True, type="str"),
                          vm_password=dict(required=True, type="str", no_log=True),
-                         vm_shell=dict(required=True, type="str"),
+                         vm_shell=dict(type="str"),
                          vm_shell_args=dict(type="str"),
+                         pid=dict(type="int"),
                          check_interval=dict(type="int", default=1),
                          time_out=dict(type="int"))
 
     module = AnsibleModule(argument_spec=argument_spec,
+                           required_one_of=[['vm_shell', 'pid']],
                            supports_check_mode=True)
 
     if(not(HAS_PYVMOMI)):
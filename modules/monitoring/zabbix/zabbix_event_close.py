@@ -15,6 +15,26 @@ ANSIBLE_METADATA = {
 }
 
 RETURN = '''
+event_ids:
+  description: List of the event IDs closed, or to be closed in check mode.
+  returned: success
+  type: list
+  sample: ["186", "187"]
+not_closable_event_ids:
+  description: List of the event IDs not closed since their triggers do not allow manual close.
+  returned: success
+  type: list
+  sample: ["188"]
+last_event_id:
+  description: The last event ID processed by the sweep.
+  returned: when state_file is specified
+  type: str
+  sample: "187"
+last_clock:
+  description: The time of the last event processed by the sweep.
+  returned: when state_file is specified
+  type: str
+  sample: "1565340000"
 '''
 
 DOCUMENTATION = '''
@@ -25,19 +45,75 @@ author:
 version_added: ''
 description:
   - This module closes the event that occurred in Zabbix.
+  - The events to close are selected with a single problem.get call, so the events already closed are skipped.
+  - The events whose triggers do not allow manual close are not closed and are returned in not_closable_event_ids.
+  - Can run over the zabbix httpapi connection plugin, which shares one login among all the tasks.
 requirements:
   - python >= 2.6
-  - zabbix-api
+  - requests
 options:
-    event_id:
+    server_url:
+        description:
+            - URL of Zabbix server, with protocol (http or https).
+            - Required unless the zabbix httpapi connection is used.
+        type: str
+        aliases: [ url ]
+    login_user:
+        description:
+            - Zabbix user name.
+            - Required unless the zabbix httpapi connection is used.
+        type: str
+    login_password:
         description:
-            - Specify event ID to be closed.
+            - Zabbix user password.
+            - Required unless the zabbix httpapi connection is used.
         type: str
-        required: true
+    event_id:
+        description:
+            - Specify event ID or list of event IDs to be closed.
+        type: list
+    hosts:
+        description:
+            - Specify list of host names to close the events of.
+        type: list
+    host_groups:
+        description:
+            - Specify list of host group names to close the events of.
+        type: list
+    triggers:
+        description:
+            - Specify list of trigger names to close the events of.
+        type: list
+    severities:
+        description:
+            - Specify list of severities to close the events of.
+        choices: [ not_classified, information, warning, average, high, disaster ]
+        type: list
+    older_than:
+        description:
+            - Specify the number of seconds to close only the events older than it.
+        type: int
     message:
         description:
             - Specify the message to add when event closing.
         type: str
+    batch_size:
+        description:
+            - Specify the number of events closed by one event.acknowledge call.
+        default: 500
+        type: int
+    state_file:
+        description:
+            - Specify the path of a local file to store the last event ID and time processed.
+            - If specified, only the events newer than the last processed event are got, page by page,
+              and the file is updated after each page is closed.
+            - If the selectors are changed, the events are processed from the beginning.
+        type: path
+    page_size:
+        description:
+            - Specify the number of events got by one problem.get call when state_file is specified.
+        default: 1000
+        type: int
 extends_documentation_fragment:
     - zabbix
 '''
@@ -49,92 +125,229 @@ EXAMPLES = '''
     server_url: http://monitor.example.com
     login_user: username
     login_password: password
-    host_name: ExampleHost
     timeout: 10
     event_id: 186
     message: auto close
-'''
-
-from ansible.module_utils.basic import AnsibleModule
 
-try:
-    from zabbix_api import ZabbixAPI, ZabbixAPISubClass
+- name: Close the warning events of the hosts older than one day
+  local_action:
+    module: zabbix_event_close
+    server_url: http://monitor.example.com
+    login_user: username
+    login_password: password
+    hosts:
+      - ExampleHost01
+      - ExampleHost02
+    severities:
+      - warning
+    older_than: 86400
+    message: auto close
 
-    # Extend the ZabbixAPI
-    # Since the zabbix-api python module too old (version 1.0, no higher version so far),
-    # it does not support the 'hostinterface' api calls,
-    # so we have to inherit the ZabbixAPI class to add 'hostinterface' support.
-    class ZabbixAPIExtends(ZabbixAPI):
-        hostinterface = None
+- name: Close the events older than one day that occurred after the last run
+  local_action:
+    module: zabbix_event_close
+    server_url: http://monitor.example.com
+    login_user: username
+    login_password: password
+    older_than: 86400
+    state_file: /var/lib/zabbix_event_close/sweep.json
+    page_size: 1000
+    message: auto close
+'''
 
-        def __init__(self, server, timeout, user, passwd, validate_certs, **kwargs):
-            ZabbixAPI.__init__(self, server, timeout=timeout, user=user, passwd=passwd, validate_certs=validate_certs)
-            self.hostinterface = ZabbixAPISubClass(self, dict({"prefix": "hostinterface"}, **kwargs))
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.zabbix_client import (connect_to_zabbix, get_ids_by_names, read_json_state, write_json_state,
+                                                zabbix_argument_spec)
+import hashlib
+import json
+import time
 
-    HAS_ZABBIX_API = True
-except ImportError:
-    HAS_ZABBIX_API = False
+SEVERITIES = {
+    'not_classified': 0,
+    'information': 1,
+    'warning': 2,
+    'average': 3,
+    'high': 4,
+    'disaster': 5
+}
 
 
 class Host(object):
     def __init__(self, module, zbx):
         self._module = module
         self._zapi = zbx
+        self._manual_close = {}
+
+    def get_ids(self, api, id_key, name_key, names):
+        """Get the IDs of the objects by names with a single call"""
+        try:
+            return get_ids_by_names(api, id_key, name_key, names)
+        except Exception as e:
+            self._module.fail_json(msg='%s' % e)
+
+    def get_problem_params(self, event_ids, hosts, host_groups, triggers, severities, older_than):
+        """Get the problem.get parameters to select the events not closed yet"""
+        params = {
+            'output': ['eventid', 'objectid'],
+            'source': 0,
+            'object': 0
+        }
+        if event_ids:
+            params['eventids'] = event_ids
+        if hosts:
+            params['hostids'] = self.get_ids(self._zapi.host, 'hostid', 'name', hosts)
+        if host_groups:
+            params['groupids'] = self.get_ids(self._zapi.hostgroup, 'groupid', 'name', host_groups)
+        if triggers:
+            params['objectids'] = self.get_ids(self._zapi.trigger, 'triggerid', 'description', triggers)
+        if severities:
+            params['severities'] = [SEVERITIES[x] for x in severities]
+        if older_than is not None:
+            params['time_till'] = int(time.time()) - older_than
+
+        return params
+
+    def get_open_problems(self, params):
+        """Get the problems of the events not closed yet"""
+        try:
+            return self._zapi.problem.get(params)
+        except Exception as e:
+            self._module.fail_json(msg='%s' % e)
+
+    def split_closable_event_ids(self, problems):
+        """Split the event IDs of the problems by whether their triggers allow manual close
+
+        The triggers not seen yet are got with a single trigger.get call.
+        """
+        trigger_ids = sorted(set(x['objectid'] for x in problems if x['objectid'] not in self._manual_close))
+        if trigger_ids:
+            try:
+                triggers = self._zapi.trigger.get({
+                    'output': ['triggerid', 'manual_close'],
+                    'triggerids': trigger_ids
+                })
+            except Exception as e:
+                self._module.fail_json(msg='%s' % e)
+            for trigger_id in trigger_ids:
+                self._manual_close[trigger_id] = False
+            for trigger in triggers:
+                self._manual_close[trigger['triggerid']] = str(trigger['manual_close']) == '1'
 
-    def event_close(self, event_id, message):
+        event_ids = []
+        not_closable_event_ids = []
+        for problem in problems:
+            if self._manual_close[problem['objectid']]:
+                event_ids.append(problem['eventid'])
+            else:
+                not_closable_event_ids.append(problem['eventid'])
+        return event_ids, not_closable_event_ids
+
+    def sweep_event_close(self, params, message, batch_size, page_size, state, state_file):
+        """Close the events newer than the last processed event page by page, updating the state
+
+        The events which can not be closed manually are skipped, so the state moves past them.
+        """
+        params = dict(params, output=['eventid', 'objectid', 'clock'], sortfield=['eventid'], sortorder='ASC',
+                      limit=page_size)
+        event_ids = []
+        not_closable_event_ids = []
+        while True:
+            if state.get('last_event_id'):
+                params['eventid_from'] = str(int(state['last_event_id']) + 1)
+
+            try:
+                problems = self._zapi.problem.get(params)
+            except Exception as e:
+                self._module.fail_json(msg='%s' % e)
+
+            if not problems:
+                break
+
+            page_event_ids, page_not_closable_event_ids = self.split_closable_event_ids(problems)
+            if page_event_ids and not self._module.check_mode:
+                self.event_close(page_event_ids, message, batch_size)
+            event_ids.extend(page_event_ids)
+            not_closable_event_ids.extend(page_not_closable_event_ids)
+
+            state['last_event_id'] = problems[-1]['eventid']
+            state['last_clock'] = problems[-1]['clock']
+            if not self._module.check_mode:
+                write_json_state(self._module, state_file, state)
+
+            if len(problems) < page_size:
+                break
+
+        return event_ids, not_closable_event_ids
+
+    def event_close(self, event_ids, message, batch_size):
         try:
-            self._zapi.event.acknowledge({
-                'eventids': event_id,
-                'message': message,
-                'action': 1
-            })
+            for i in range(0, len(event_ids), batch_size):
+                self._zapi.event.acknowledge({
+                    'eventids': event_ids[i:i + batch_size],
+                    'message': message,
+                    'action': 1
+                })
         except Exception as e:
             self._module.fail_json(msg='%s' % e)
 
 
 def main():
+    argument_spec = zabbix_argument_spec()
+    argument_spec.update(
+        event_id=dict(type='list'),
+        hosts=dict(type='list'),
+        host_groups=dict(type='list'),
+        triggers=dict(type='list'),
+        severities=dict(type='list', choices=list(SEVERITIES.keys())),
+        older_than=dict(type='int'),
+        message=dict(type='str'),
+        batch_size=dict(type='int', default=500),
+        state_file=dict(type='path'),
+        page_size=dict(type='int', default=1000)
+    )
+
     module = AnsibleModule(
-        argument_spec=dict(
-            server_url=dict(type='str', required=True, aliases=['url']),
-            login_user=dict(type='str', required=True),
-            login_password=dict(type='str', required=True, no_log=True),
-            http_login_user=dict(type='str', required=False, default=None),
-            http_login_password=dict(type='str', required=False, default=None, no_log=True),
-            validate_certs=dict(type='bool', required=False, default=True),
-            timeout=dict(type='int', default=10),
-            event_id=dict(type='str', required=True),
-            message=dict(type='str')
-        ),
+        argument_spec=argument_spec,
+        required_one_of=[['event_id', 'hosts', 'host_groups', 'triggers', 'severities', 'older_than', 'state_file']],
+        mutually_exclusive=[['event_id', 'state_file']],
         supports_check_mode=True
     )
 
-    if not HAS_ZABBIX_API:
-        module.fail_json(msg="Missing required zabbix-api module (check docs or install with: pip install zabbix-api)")
-
-    server_url = module.params['server_url']
-    login_user = module.params['login_user']
-    login_password = module.params['login_password']
-    http_login_user = module.params['http_login_user']
-    http_login_password = module.params['http_login_password']
-    validate_certs = module.params['validate_certs']
-    timeout = module.params['timeout']
     event_id = module.params['event_id']
+    hosts = module.params['hosts']
+    host_groups = module.params['host_groups']
+    triggers = module.params['triggers']
+    severities = module.params['severities']
+    older_than = module.params['older_than']
     message = module.params['message']
+    batch_size = module.params['batch_size']
+    state_file = module.params['state_file']
+    page_size = module.params['page_size']
 
-    zbx = None
-    # login to zabbix
-    try:
-        zbx = ZabbixAPIExtends(server_url, timeout=timeout, user=http_login_user, passwd=http_login_password,
-                               validate_certs=validate_certs)
-        zbx.login(login_user, login_password)
-    except Exception as e:
-        module.fail_json(msg="Failed to connect to Zabbix server: %s" % e)
+    if batch_size < 1 or page_size < 1:
+        module.fail_json(msg="batch_size and page_size must be greater than 0.")
+
+    # login to zabbix, or reuse the login of the httpapi connection
+    zbx = connect_to_zabbix(module)
 
     host = Host(module, zbx)
 
-    host.event_close(event_id, message)
+    params = host.get_problem_params(event_id, hosts, host_groups, triggers, severities, older_than)
+
+    if state_file:
+        # older_than is excluded since time_till moves on every run.
+        selector = json.dumps([hosts, host_groups, triggers, severities], sort_keys=True)
+        state = read_json_state(state_file, hashlib.sha1(selector.encode('utf-8')).hexdigest())
+        event_ids, not_closable_event_ids = host.sweep_event_close(params, message, batch_size, page_size, state,
+                                                                   state_file)
+        module.exit_json(changed=bool(event_ids), event_ids=event_ids, not_closable_event_ids=not_closable_event_ids,
+                         last_event_id=state.get('last_event_id'), last_clock=state.get('last_clock'))
+
+    event_ids, not_closable_event_ids = host.split_closable_event_ids(host.get_open_problems(params))
+    if event_ids and not module.check_mode:
+        host.event_close(event_ids, message, batch_size)
 
-    module.exit_json(changed=True)
+    module.exit_json(changed=bool(event_ids), event_ids=event_ids, not_closable_event_ids=not_closable_event_ids)
 
 
 if __name__ == "__main__":
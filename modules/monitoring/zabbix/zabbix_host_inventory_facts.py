@@ -17,9 +17,36 @@ ANSIBLE_METADATA = {
 RETURN = '''
 hosts_inventory:
   description: List of Zabbix hosts. See https://www.zabbix.com/documentation/3.4/manual/api/reference/host/get for list of host values.
-  returned: success
+  returned: success and snapshot_file is not specified
   type: dict
   sample: "[{'hostid': '10263', 'proxy_hostid': '0', ..., {'poc_2_phone_b': '', 'poc_2_cell': '', 'poc_2_screen': '', 'poc_2_notes': ''}}]"
+hosts_delta:
+  description:
+    - Hosts added and changed since the last run, and hostid and name of the hosts removed.
+  returned: when snapshot_file is specified
+  type: dict
+  sample: {"added": [{"hostid": "10264", "name": "web02", "inventory": {"os": "CentOS 7"}}],
+           "changed": [{"hostid": "10263", "name": "web01", "inventory": {"os": "CentOS 8"}}],
+           "removed": [{"hostid": "10200", "name": "old01"}]}
+hosts_count:
+  description: Number of the hosts currently got.
+  returned: when snapshot_file is specified
+  type: int
+  sample: 1200
+missing_host_ips:
+  description: List of the IPs specified by host_ip that no host interface has.
+  returned: when host_ip is specified and servers is not
+  type: list
+  sample: ["192.168.0.10"]
+servers:
+  description:
+    - Result of each server when servers is specified.
+    - The hosts in hosts_inventory have zabbix_server_url of the server they are got from.
+  returned: when servers is specified
+  type: list
+  sample: [{"server_url": "http://tokyo.example.com", "hosts_count": 120, "api_calls": 5, "seconds": 0.82},
+           {"server_url": "http://osaka.example.com", "hosts_count": 0, "api_calls": 1, "seconds": 10.01,
+            "error": "..."}]
 '''
 
 DOCUMENTATION = '''
@@ -30,10 +57,66 @@ author:
 version_added: ''
 description:
   - This module gets Zabbix host inventory.
+  - Can run over the zabbix httpapi connection plugin, which shares one login among all the tasks.
 requirements:
   - python >= 2.7
-  - zabbix-api
+  - requests
 options:
+    server_url:
+        description:
+            - URL of Zabbix server, with protocol (http or https).
+            - Required unless servers or the zabbix httpapi connection is used.
+            - Mutually exclusive with servers.
+        type: str
+        aliases: [ url ]
+    servers:
+        description:
+            - List of the Zabbix servers to query concurrently instead of server_url. The hosts of all the servers are merged.
+            - The options not specified in an element are taken from the module options.
+            - If some of the servers fail, their errors are returned in servers and the module fails only when all of them fail.
+            - A server without the hosts, host groups or templates specified returns no hosts and is not counted as failed.
+        type: list
+        elements: dict
+        suboptions:
+            server_url:
+                description:
+                    - URL of Zabbix server, with protocol (http or https).
+                required: true
+                type: str
+            login_user:
+                description:
+                    - Zabbix user name.
+                type: str
+            login_password:
+                description:
+                    - Zabbix user password.
+                type: str
+            http_login_user:
+                description:
+                    - Basic Auth login.
+                type: str
+            http_login_password:
+                description:
+                    - Basic Auth password.
+                type: str
+            validate_certs:
+                description:
+                    - If set to False, SSL certificates will not be validated.
+                type: bool
+            timeout:
+                description:
+                    - The timeout of API request (seconds).
+                type: int
+    login_user:
+        description:
+            - Zabbix user name.
+            - Required unless the zabbix httpapi connection is used.
+        type: str
+    login_password:
+        description:
+            - Zabbix user password.
+            - Required unless the zabbix httpapi connection is used.
+        type: str
     host_name:
         description:
             - Name of the host in Zabbix.
@@ -42,7 +125,9 @@ options:
         type: str
     host_ip:
         description:
-            - Host interface IP of the host in Zabbix.
+            - List of host interface IPs of the hosts in Zabbix.
+            - The IPs are looked up with one hostinterface.get call, and the hosts are got with host.get by the host IDs found.
+            - If host_name is also specified, the hosts matching both are returned.
         required: false
         type: list
     exact_match:
@@ -55,6 +140,73 @@ options:
             - Remove duplicate host from host result
         type: bool
         default: yes
+    host_fields:
+        description:
+            - List of host properties to get, passed to host.get as output.
+            - hostid and name are always got.
+            - If not specified, all the host properties are got.
+        type: list
+    inventory_fields:
+        description:
+            - List of inventory properties to get, passed to host.get as selectInventory.
+            - If not specified, all the inventory properties are got.
+        type: list
+    host_groups:
+        description:
+            - List of host group names to get only the hosts in them.
+        type: list
+    templates:
+        description:
+            - List of template names to get only the hosts linked to them.
+        type: list
+    tags:
+        description:
+            - List of host tags to get only the hosts having them.
+            - Requires Zabbix 4.2 or higher.
+        type: list
+        suboptions:
+            tag:
+                description:
+                    - Tag name.
+                type: str
+                required: true
+            value:
+                description:
+                    - Tag value.
+                type: str
+                default: ''
+            operator:
+                description:
+                    - If C(operator) is set to C(like), the tag value contains the value.
+                    - If C(operator) is set to C(equal), the tag value equals the value.
+                choices: [ like, equal ]
+                default: like
+                type: str
+    inventory_search:
+        description:
+            - Dict of inventory properties and the values to search, passed to host.get as searchInventory.
+        type: dict
+    page_size:
+        description:
+            - Number of hosts got by one host.get call.
+            - The host IDs are got first, then the hosts are got page by page by ranges of the host IDs,
+              so that a large host.get does not hit the memory limit or the timeout of the Zabbix frontend.
+            - If set to 0, all the hosts are got by one host.get call.
+        default: 1000
+        type: int
+    max_workers:
+        description:
+            - Number of pages got concurrently.
+        default: 1
+        type: int
+    snapshot_file:
+        description:
+            - Path of a local file to keep the content hash of each host.
+            - If specified, only the hosts added, changed and removed since the last run are returned in hosts_delta
+              instead of hosts_inventory, and the snapshot is updated unless in check mode.
+            - If the options selecting the hosts or the fields are changed, the snapshot starts over and all the hosts are added.
+            - When servers is specified, the hosts of the servers which fail are not reported as removed.
+        type: path
 extends_documentation_fragment:
     - zabbix
 '''
@@ -70,128 +222,363 @@ EXAMPLES = '''
     timeout: 10
     exact_match: no
     remove_duplicate: yes
-'''
 
-from ansible.module_utils.basic import AnsibleModule
+- name: Get only the host name and the inventory OS and location
+  local_action:
+    module: zabbix_host_inventory_facts
+    server_url: http://monitor.example.com
+    login_user: username
+    login_password: password
+    host_name: ExampleHost
+    host_fields:
+      - host
+    inventory_fields:
+      - os
+      - location
+
+- name: Get host inventory info by the interface IPs
+  local_action:
+    module: zabbix_host_inventory_facts
+    server_url: http://monitor.example.com
+    login_user: username
+    login_password: password
+    host_ip:
+      - 192.168.0.10
+      - 192.168.0.11
+
+- name: Get host inventory info of the Linux servers tagged env=prod in Tokyo
+  local_action:
+    module: zabbix_host_inventory_facts
+    server_url: http://monitor.example.com
+    login_user: username
+    login_password: password
+    host_groups:
+      - Linux servers
+    tags:
+      - tag: env
+        value: prod
+        operator: equal
+    inventory_search:
+      location: Tokyo
+
+- name: Get all the host inventory 500 hosts per page, 4 pages at a time
+  local_action:
+    module: zabbix_host_inventory_facts
+    server_url: http://monitor.example.com
+    login_user: username
+    login_password: password
+    page_size: 500
+    max_workers: 4
 
-try:
-    from zabbix_api import ZabbixAPI, ZabbixAPISubClass
+- name: Get host inventory info from the Zabbix servers of all the regions at a time
+  local_action:
+    module: zabbix_host_inventory_facts
+    servers:
+      - server_url: http://tokyo.example.com
+      - server_url: http://osaka.example.com
+        login_user: osaka_user
+        login_password: osaka_password
+    login_user: username
+    login_password: password
+    host_groups:
+      - Linux servers
 
-    # Extend the ZabbixAPI
-    # Since the zabbix-api python module too old (version 1.0, no higher version so far),
-    # it does not support the 'hostinterface' api calls,
-    # so we have to inherit the ZabbixAPI class to add 'hostinterface' support.
-    class ZabbixAPIExtends(ZabbixAPI):
-        hostinterface = None
+- name: Get only the hosts changed since the last run for the CMDB sync
+  local_action:
+    module: zabbix_host_inventory_facts
+    server_url: http://monitor.example.com
+    login_user: username
+    login_password: password
+    inventory_fields:
+      - os
+      - location
+    snapshot_file: /var/lib/cmdb_sync/zabbix_hosts.json
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.zabbix_client import (HAS_REQUESTS, ZabbixHostQuery, ZabbixJsonRpcClient, ZabbixNotFoundError,
+                                                connect_to_zabbix, read_json_state, write_json_state, zabbix_argument_spec)
+from multiprocessing.pool import ThreadPool
+import hashlib
+import json
+import time
 
-        def __init__(self, server, timeout, user, passwd, validate_certs, **kwargs):
-            ZabbixAPI.__init__(self, server, timeout=timeout, user=user, passwd=passwd, validate_certs=validate_certs)
-            self.hostinterface = ZabbixAPISubClass(self, dict({"prefix": "hostinterface"}, **kwargs))
+SERVER_OPTIONS = ('server_url', 'login_user', 'login_password', 'http_login_user', 'http_login_password',
+                  'validate_certs', 'timeout')
 
-    HAS_ZABBIX_API = True
-except ImportError:
-    HAS_ZABBIX_API = False
+SERVER_ARGUMENT_SPEC = dict(
+    server_url=dict(type='str', required=True),
+    login_user=dict(type='str'),
+    login_password=dict(type='str', no_log=True),
+    http_login_user=dict(type='str'),
+    http_login_password=dict(type='str', no_log=True),
+    validate_certs=dict(type='bool'),
+    timeout=dict(type='int')
+)
 
 
-class Host(object):
+class Host(ZabbixHostQuery):
     def __init__(self, module, zbx):
+        super(Host, self).__init__(zbx,
+                                   host_fields=module.params['host_fields'],
+                                   inventory_fields=module.params['inventory_fields'],
+                                   page_size=module.params['page_size'],
+                                   max_workers=module.params['max_workers'])
         self._module = module
-        self._zapi = zbx
 
-    def get_hosts_inventory_by_host_name(self, host_name, exact_match):
+    def get_module_scope_params(self):
+        """Get the scope parameters from the module options"""
+        return self.get_scope_params(host_groups=self._module.params['host_groups'],
+                                     templates=self._module.params['templates'],
+                                     tags=self._module.params['tags'],
+                                     inventory_search=self._module.params['inventory_search'])
+
+    def get_hosts_inventory_by_host_name(self, host_name, exact_match, host_ids=None):
         """Get hosts by host name"""
         search_key = 'search'
         if exact_match:
             search_key = 'filter'
-        host_list = self._zapi.host.get({
-            'output': 'extend',
+        params = {
             search_key: {
                 'name': [host_name]
             },
-            "withInventory": True,
-            "selectInventory": "extend"
-        })
+            "withInventory": True
+        }
+        if host_ids is not None:
+            params['hostids'] = host_ids
+        params.update(self.get_module_scope_params())
+        params.update(self.get_output_params())
+        host_list = self.get_hosts(params)
         if len(host_list) < 1:
-            self._module.fail_json(msg="Host not found: %s" % host_name)
-        else:
-            return host_list
+            raise ZabbixNotFoundError("Host not found: %s" % host_name)
+        return host_list
 
-    def get_hosts_inventory_by_all_host(self, host_name):
+    def get_hosts_inventory_by_all_host(self, host_name, host_ids=None):
         """Get hosts inventory by all host"""
-        host_list = self._zapi.host.get({
-            'output': 'extend',
-            "withInventory": True,
-            "selectInventory": "extend"
-        })
+        params = {
+            "withInventory": True
+        }
+        if host_ids is not None:
+            params['hostids'] = host_ids
+        params.update(self.get_module_scope_params())
+        params.update(self.get_output_params())
+        host_list = self.get_hosts(params)
         if len(host_list) < 1:
-            self._module.fail_json(msg="Host not found: %s" % host_name)
-        else:
-            return host_list
-
-    def delete_duplicate_hosts(self, hosts):
-        """ Delete duplicated hosts """
-        unique_hosts = []
-        listed_hostnames = []
-        for zabbix_host in hosts:
-            if zabbix_host['name'] in listed_hostnames:
-                continue
-            unique_hosts.append(zabbix_host)
-            listed_hostnames.append(zabbix_host['name'])
-        return unique_hosts
+            raise ZabbixNotFoundError("Host not found: %s" % host_name)
+        return host_list
+
+    def get_hosts_inventory(self, missing_ok=False):
+        """Get the hosts inventory of the module options and the host IPs not found
+
+        If missing_ok is True, no hosts are returned instead of raising ZabbixNotFoundError.
+        """
+        host_name = self._module.params['host_name']
+        host_ip = self._module.params['host_ip']
+
+        host_ids = None
+        missing_host_ips = None
+        try:
+            if host_ip:
+                host_ids, missing_host_ips = self.get_host_ids_by_host_ip(host_ip)
+                if not host_ids:
+                    raise ZabbixNotFoundError("Host not found: %s" % ", ".join(host_ip))
+
+            if host_name:
+                hosts_inventory = self.get_hosts_inventory_by_host_name(host_name, self._module.params['exact_match'],
+                                                                        host_ids)
+            else:
+                hosts_inventory = self.get_hosts_inventory_by_all_host(host_name, host_ids)
+        except ZabbixNotFoundError:
+            if not missing_ok:
+                raise
+            return [], missing_host_ips
+
+        if self._module.params['remove_duplicate']:
+            hosts_inventory = self.delete_duplicate_hosts(hosts_inventory)
+        return hosts_inventory, missing_host_ips
+
+
+def get_servers(module):
+    """Get the connection parameters of each server of servers
+
+    The options not specified in an element are taken from the module options.
+    """
+    if not module.params['servers']:
+        return None
+
+    servers = []
+    for server in module.params['servers']:
+        params = dict((x, module.params[x]) for x in SERVER_OPTIONS)
+        params.update(dict((k, v) for k, v in server.items() if v is not None))
+        missing = [x for x in ('login_user', 'login_password') if not params[x]]
+        if missing:
+            module.fail_json(msg="missing required arguments in servers: %s" % ", ".join(missing))
+        servers.append(params)
+    return servers
+
+
+def get_server_hosts_inventory(module, server):
+    """Get the hosts inventory from one server, recording the time and the error instead of failing"""
+    start = time.time()
+    result = dict(server_url=server['server_url'], hosts_count=0, api_calls=0)
+    zbx = None
+    try:
+        zbx = ZabbixJsonRpcClient(server['server_url'], timeout=server['timeout'],
+                                  http_login_user=server['http_login_user'],
+                                  http_login_password=server['http_login_password'],
+                                  validate_certs=server['validate_certs'])
+        zbx.login(server['login_user'], server['login_password'])
+        try:
+            # a server without the hosts, host groups or templates is not an error in a fan-out across the regions
+            hosts_inventory, missing_host_ips = Host(module, zbx).get_hosts_inventory(missing_ok=True)
+        finally:
+            zbx.logout()
+
+        for zabbix_host in hosts_inventory:
+            zabbix_host['zabbix_server_url'] = server['server_url']
+        result['hosts_inventory'] = hosts_inventory
+        result['hosts_count'] = len(hosts_inventory)
+        if missing_host_ips is not None:
+            result['missing_host_ips'] = missing_host_ips
+    except Exception as e:
+        result['error'] = "%s" % e
+
+    if zbx is not None:
+        result['api_calls'] = sum(len(x['methods']) for x in zbx.latency)
+    result['seconds'] = round(time.time() - start, 6)
+    return result
+
+
+def get_snapshot_selector(module):
+    """Get the hash of the options deciding which hosts and fields are got"""
+    options = ('server_url', 'host_name', 'host_ip', 'exact_match', 'remove_duplicate', 'host_fields', 'inventory_fields',
+               'host_groups', 'templates', 'tags', 'inventory_search')
+    selector = dict((x, module.params[x]) for x in options)
+    selector['servers'] = [x['server_url'] for x in module.params['servers'] or []]
+    return hashlib.sha1(json.dumps(selector, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def get_hosts_delta(snapshot, hosts_inventory, failed_server_urls=None):
+    """Compare the hosts with the snapshot by the content hash of each host
+
+    The snapshot is updated to the current hosts and the added, changed and removed hosts are returned.
+    The hosts of the servers which failed are kept in the snapshot and not reported as removed.
+    """
+    failed_server_urls = failed_server_urls or []
+    previous_hosts = snapshot['hosts']
+    current_hosts = {}
+    delta = dict(added=[], changed=[], removed=[])
+
+    for zabbix_host in hosts_inventory:
+        server_url = zabbix_host.get('zabbix_server_url')
+        key = zabbix_host['hostid'] if server_url is None else "%s#%s" % (server_url, zabbix_host['hostid'])
+        content_hash = hashlib.sha1(json.dumps(zabbix_host, sort_keys=True).encode('utf-8')).hexdigest()
+        current_hosts[key] = dict(name=zabbix_host['name'], hash=content_hash)
+        if server_url is not None:
+            current_hosts[key]['server_url'] = server_url
+
+        if key not in previous_hosts:
+            delta['added'].append(zabbix_host)
+        elif previous_hosts[key]['hash'] != content_hash:
+            delta['changed'].append(zabbix_host)
+
+    for key, previous_host in previous_hosts.items():
+        if key in current_hosts:
+            continue
+        if previous_host.get('server_url') in failed_server_urls:
+            current_hosts[key] = previous_host
+            continue
+        removed_host = dict(hostid=key.rsplit('#', 1)[-1], name=previous_host['name'])
+        if 'server_url' in previous_host:
+            removed_host['zabbix_server_url'] = previous_host['server_url']
+        delta['removed'].append(removed_host)
+
+    snapshot['hosts'] = current_hosts
+    return delta
+
+
+def exit_with_hosts_inventory(module, hosts_inventory, failed_server_urls=None, **result):
+    """Exit with the hosts inventory, or only with the delta from the snapshot if snapshot_file is set"""
+    snapshot_file = module.params['snapshot_file']
+    if not snapshot_file:
+        module.exit_json(hosts_inventory=hosts_inventory, **result)
+
+    snapshot = read_json_state(snapshot_file, get_snapshot_selector(module), {'hosts': {}})
+    delta = get_hosts_delta(snapshot, hosts_inventory, failed_server_urls)
+    if not module.check_mode:
+        write_json_state(module, snapshot_file, snapshot)
+    module.exit_json(hosts_delta=delta, hosts_count=len(hosts_inventory), **result)
 
 
 def main():
+    argument_spec = zabbix_argument_spec()
+    argument_spec.update(
+        servers=dict(type='list', elements='dict', options=SERVER_ARGUMENT_SPEC),
+        host_name=dict(type='str', default='', required=False),
+        host_ip=dict(type='list', default=[], required=False),
+        exact_match=dict(type='bool', required=False, default=False),
+        remove_duplicate=dict(type='bool', required=False, default=True),
+        host_fields=dict(type='list'),
+        inventory_fields=dict(type='list'),
+        host_groups=dict(type='list'),
+        templates=dict(type='list'),
+        tags=dict(type='list', elements='dict',
+                  options=dict(
+                      tag=dict(type='str', required=True),
+                      value=dict(type='str', default=''),
+                      operator=dict(type='str', choices=['like', 'equal'], default='like')
+                  )),
+        inventory_search=dict(type='dict'),
+        page_size=dict(type='int', default=1000),
+        max_workers=dict(type='int', default=1),
+        snapshot_file=dict(type='path')
+    )
+
     module = AnsibleModule(
-        argument_spec=dict(
-            server_url=dict(type='str', required=True, aliases=['url']),
-            login_user=dict(type='str', required=True),
-            login_password=dict(type='str', required=True, no_log=True),
-            host_name=dict(type='str', default='', required=False),
-            host_ip=dict(type='list', default=[], required=False),
-            http_login_user=dict(type='str', required=False, default=None),
-            http_login_password=dict(type='str', required=False, default=None, no_log=True),
-            validate_certs=dict(type='bool', required=False, default=True),
-            timeout=dict(type='int', default=10),
-            exact_match=dict(type='bool', required=False, default=False),
-            remove_duplicate=dict(type='bool', required=False, default=True)
-        ),
+        argument_spec=argument_spec,
+        mutually_exclusive=[['server_url', 'servers']],
         supports_check_mode=True
     )
 
-    if not HAS_ZABBIX_API:
-        module.fail_json(msg="Missing required zabbix-api module (check docs or install with: pip install zabbix-api)")
+    if module.params['page_size'] < 0 or module.params['max_workers'] < 1:
+        module.fail_json(msg="page_size must not be negative and max_workers must be greater than 0.")
 
-    server_url = module.params['server_url']
-    login_user = module.params['login_user']
-    login_password = module.params['login_password']
-    http_login_user = module.params['http_login_user']
-    http_login_password = module.params['http_login_password']
-    validate_certs = module.params['validate_certs']
-    host_name = module.params['host_name']
-    timeout = module.params['timeout']
-    exact_match = module.params['exact_match']
-    is_remove_duplicate = module.params['remove_duplicate']
+    servers = get_servers(module)
+    if servers is None:
+        # login to zabbix, or reuse the login of the httpapi connection
+        zbx = connect_to_zabbix(module)
 
-    zbx = None
-    # login to zabbix
-    try:
-        zbx = ZabbixAPIExtends(server_url, timeout=timeout, user=http_login_user, passwd=http_login_password,
-                               validate_certs=validate_certs)
-        zbx.login(login_user, login_password)
-    except Exception as e:
-        module.fail_json(msg="Failed to connect to Zabbix server: %s" % e)
+        result = dict(ok=True)
+        try:
+            hosts_inventory, missing_host_ips = Host(module, zbx).get_hosts_inventory()
+        except Exception as e:
+            module.fail_json(msg="%s" % e)
+        if missing_host_ips is not None:
+            result['missing_host_ips'] = missing_host_ips
+        exit_with_hosts_inventory(module, hosts_inventory, **result)
+
+    if not HAS_REQUESTS:
+        module.fail_json(msg="requests library not found")
 
-    host = Host(module, zbx)
+    # query all the servers concurrently, so the time is bounded by the slowest server
+    pool = ThreadPool(processes=len(servers))
+    try:
+        server_results = pool.map(lambda x: get_server_hosts_inventory(module, x), servers)
+    finally:
+        pool.close()
+        pool.join()
 
-    if host_name:
-        hosts_inventory = host.get_hosts_inventory_by_host_name(host_name, exact_match)
-    else:
-        hosts_inventory = host.get_hosts_inventory_by_all_host(host_name)
+    hosts_inventory = []
+    for server_result in server_results:
+        hosts_inventory.extend(server_result.pop('hosts_inventory', []))
 
-    if is_remove_duplicate:
-        hosts_inventory = host.delete_duplicate_hosts(hosts_inventory)
+    errors = ["%s: %s" % (x['server_url'], x['error']) for x in server_results if 'error' in x]
+    if len(errors) == len(server_results):
+        module.fail_json(msg="Failed to get the hosts inventory from all the servers: %s" % "; ".join(errors),
+                         servers=server_results)
 
-    module.exit_json(ok=True, hosts_inventory=hosts_inventory)
+    failed_server_urls = [x['server_url'] for x in server_results if 'error' in x]
+    exit_with_hosts_inventory(module, hosts_inventory, failed_server_urls, ok=True, servers=server_results)
 
 
 if __name__ == "__main__":
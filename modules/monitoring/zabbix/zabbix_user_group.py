@@ -22,23 +22,25 @@ author:
 version_added: ''
 description:
     - Create user groups if they do not exist.
+    - Update the rights and the users of existing user groups with one usergroup.update if they differ.
     - Delete existing user groups if they exist.
+    - Can run over the zabbix httpapi connection plugin, which shares one login among all the tasks.
 requirements:
     - python >= 2.6
-    - zabbix-api
+    - requests
 options:
     server_url:
         description:
             - Specify the URL of zabbix server.
-        required: True
+            - Required unless the httpapi connection is used.
     login_user:
         description:
             - Specify the user name to login to the zabbix server.
-        required: True
+            - Required unless the httpapi connection is used.
     login_password:
         description:
             - Specify the user name to login to the zabbix server.
-        required: True
+            - Required unless the httpapi connection is used.
     validate_certs:
         description:
             - Specify the password to login to the zabbix server.
@@ -46,11 +48,12 @@ options:
     user_group_name:
         description:
             - Specify the user group name.
-        required: True
+            - Required unless user_groups is specified.
         type: str
     host_groups:
         description:
             - Specify the host group to be associated with the user group.
+            - If not specified, the rights of an existing user group are not changed.
             - 'Valid attributes are:'
             - '   host_group_name: Specify host group name.'
             - '   permission: Specify the permission to be associated with the host group'
@@ -70,6 +73,7 @@ options:
     users:
         description:
             - Specify the user(alias name) to be associated with the user group.
+            - If not specified, the users of an existing user group are not changed.
         type: list
     state:
         description:
@@ -77,6 +81,58 @@ options:
         default: present
         choices: [ present, absent ]
         type: str
+    user_groups:
+        description:
+            - Specify the list of the desired user groups to reconcile them in one task instead of user_group_name.
+            - The user groups, the host groups and the users are got once, and the creates, updates and deletes are sent
+              batch_size user groups per call.
+            - The result of each user group is returned in user_groups.
+        type: list
+        elements: dict
+        suboptions:
+            name:
+                description:
+                    - Specify the user group name.
+                type: str
+                required: true
+            host_groups:
+                description:
+                    - Specify the host groups to be associated with the user group, same as host_groups.
+                type: list
+                elements: dict
+                suboptions:
+                    host_group_name:
+                        description:
+                            - Specify host_group_name.
+                        type: str
+                        required: true
+                    permission:
+                        description:
+                            - Specify permission.
+                        choices: ['deny', 'read', 'read-write']
+                        type: str
+                        required: true
+            users:
+                description:
+                    - Specify the users(alias name) to be associated with the user group.
+                type: list
+            state:
+                description:
+                    - Create or delete the user group.
+                default: present
+                choices: [ present, absent ]
+                type: str
+    purge:
+        description:
+            - Delete all the user groups which are not in user_groups.
+            - Note that this deletes the built-in user groups too if they are not in user_groups.
+        default: False
+        type: bool
+    batch_size:
+        description:
+            - Specify the number of the user groups created, updated or deleted by one call with user_groups.
+        default: 100
+        type: int
     timeout:
         description:
             - Specify the timeout time for Zabbix server connection.
@@ -85,6 +141,14 @@ extends_documentation_fragment:
     - zabbix
 '''
 
+RETURN = '''
+user_groups:
+  description: Result of each user group of user_groups, one of created, updated, deleted, unchanged and failed.
+  returned: when user_groups is specified
+  type: list
+  sample: [{"name": "linux operators", "result": "updated"}, {"name": "old group", "result": "deleted"}]
+'''
+
 EXAMPLES = '''
 ---
 - zabbix_user_group:
@@ -110,17 +174,32 @@ EXAMPLES = '''
     validate_certs: no
     user_group_name: test group
     state: absent
-'''
 
-try:
-    from zabbix_api import ZabbixAPI, ZabbixAPISubClass
-
-    HAS_ZABBIX_API = True
-except ImportError:
-    HAS_ZABBIX_API = False
+- name: Reconcile all the user groups in one task
+  zabbix_user_group:
+    server_url: http://127.0.0.1/zabbix
+    login_user: admin
+    login_password: zabbix
+    user_groups:
+      - name: linux operators
+        host_groups:
+          - host_group_name: Linux servers
+            permission: read-write
+        users:
+          - test
+      - name: old group
+        state: absent
+    batch_size: 100
+'''
 
 from ansible.module_utils.basic import AnsibleModule
-from collections import defaultdict
+from ansible.module_utils.zabbix_client import connect_to_zabbix, zabbix_argument_spec
+
+HOST_GROUP_PERMISSION = {
+    'deny': 0,
+    'read': 2,
+    'read-write': 3
+}
 
 
 def check_user_group(zbx, user_group):
@@ -137,43 +216,184 @@ def check_user_group(zbx, user_group):
         return None
 
 
-def get_host_group_id(zbx, host_group):
-    r = zbx.hostgroup.get({
+def get_user_group_call(user_group_names=None):
+    """Get the usergroup.get call getting the user groups with their rights and users"""
+    params = {
         'output': 'extend',
-        'filter': {
-            'name': host_group
+        'selectRights': 'extend',
+        'selectUsers': ['userid', 'alias']
+    }
+    if user_group_names is not None:
+        params['filter'] = {
+            'name': user_group_names
         }
-    })
-
-    if(r):
-        return r[0]
-    else:
+    return 'usergroup.get', params
+
+
+def get_host_group_and_user_calls(host_groups, users):
+    """Get the calls looking up all the host groups with one hostgroup.get and all the users with one user.get"""
+    calls = []
+    if host_groups:
+        calls.append(('hostgroup.get', {
+            'output': ['groupid', 'name'],
+            'filter': {
+                'name': host_groups
+            }
+        }))
+    if users:
+        calls.append(('user.get', {
+            'output': ['userid', 'alias'],
+            'filter': {
+                'alias': users
+            }
+        }))
+    return calls
+
+
+def parse_host_group_and_user_ids(results, host_groups, users):
+    """Get the dicts of the names to the IDs and the list of the names not found from the results of the calls"""
+    results = list(results)
+    host_group_ids = dict((x['name'], x['groupid']) for x in results.pop(0)) if host_groups else {}
+    user_ids = dict((x['alias'], x['userid']) for x in results.pop(0)) if users else {}
+
+    missing = ["host group %s" % x for x in host_groups if x not in host_group_ids]
+    missing.extend(["user %s" % x for x in users if x not in user_ids])
+    return host_group_ids, user_ids, missing
+
+
+def get_user_group_update(user_group, rights, user_ids):
+    """Get the usergroup.update parameters of only what differs, or None if nothing differs
+
+    rights and user_ids of None are not compared and not updated.
+    """
+    params = {}
+    if rights is not None:
+        current_rights = sorted((x['id'], str(x['permission'])) for x in user_group.get('rights', []))
+        desired_rights = sorted((x['id'], str(x['permission'])) for x in rights)
+        if current_rights != desired_rights:
+            params['rights'] = rights
+    if user_ids is not None:
+        current_user_ids = set(x['userid'] for x in user_group.get('users', []))
+        if current_user_ids != set(user_ids):
+            params['userids'] = user_ids
+
+    if not params:
         return None
+    params['usrgrpid'] = user_group['usrgrpid']
+    return params
+
+
+def apply_user_group_changes(module, zbx, method, chunks, outcome, results):
+    """Call the method once per chunk of (name, params), setting the outcome or the error of each user group"""
+    for chunk in chunks:
+        if not module.check_mode:
+            try:
+                zbx.do_request(method, [params for name, params in chunk])
+            except Exception as e:
+                for name, params in chunk:
+                    results[name].update(result='failed', msg="%s" % e)
+                continue
+        for name, params in chunk:
+            results[name]['result'] = outcome
+
+
+def reconcile_user_groups(module, zbx):
+    """Reconcile all the user groups of user_groups
+
+    The user groups, the host groups and the users are got in one HTTP round trip,
+    the differences are computed in memory and the deletes, updates and creates
+    are sent batch_size user groups per call.
+    """
+    user_groups = module.params['user_groups']
+    batch_size = module.params['batch_size']
+    purge = module.params['purge']
+
+    names = [x['name'] for x in user_groups]
+    listed_names = set()
+    duplicates = set()
+    for name in names:
+        if name in listed_names:
+            duplicates.add(name)
+        listed_names.add(name)
+    if duplicates:
+        module.fail_json(msg="Duplicate user groups in user_groups: %s" % ", ".join(sorted(duplicates)))
+
+    host_group_names = []
+    user_names = []
+    for user_group in user_groups:
+        if user_group['state'] != 'present':
+            continue
+        for host_group in user_group['host_groups'] or []:
+            if host_group['host_group_name'] not in host_group_names:
+                host_group_names.append(host_group['host_group_name'])
+        for user in user_group['users'] or []:
+            if user not in user_names:
+                user_names.append(user)
 
+    try:
+        r = zbx.batch([get_user_group_call(None if purge else names)] +
+                      get_host_group_and_user_calls(host_group_names, user_names))
+    except Exception as e:
+        module.fail_json(msg="%s" % e)
+    existing_user_groups = dict((x['name'], x) for x in r[0])
+    host_group_ids, found_user_ids, missing = parse_host_group_and_user_ids(r[1:], host_group_names, user_names)
+    if missing:
+        module.fail_json(msg="%s not found." % ", ".join(missing))
+
+    results = dict((x, dict(name=x, result='unchanged')) for x in names)
+    deletes = []
+    updates = []
+    creates = []
+    for user_group in user_groups:
+        name = user_group['name']
+        existing_user_group = existing_user_groups.get(name)
+        if user_group['state'] == 'absent':
+            if existing_user_group:
+                deletes.append((name, existing_user_group['usrgrpid']))
+            continue
+
+        rights = None
+        if user_group['host_groups'] is not None:
+            rights = [{'permission': HOST_GROUP_PERMISSION[x['permission']],
+                       'id': host_group_ids[x['host_group_name']]} for x in user_group['host_groups']]
+        user_ids = None
+        if user_group['users'] is not None:
+            user_ids = [found_user_ids[x] for x in user_group['users']]
+
+        if existing_user_group:
+            params = get_user_group_update(existing_user_group, rights, user_ids)
+            if params is not None:
+                updates.append((name, params))
+        else:
+            creates.append((name, {'name': name, 'rights': rights or [], 'userids': user_ids or []}))
 
-def get_user_id(zbx, user):
-    r = zbx.user.get({
-        'output': 'extend',
-        'filter': {
-            'alias': user
-        }
-    })
+    if purge:
+        for name, existing_user_group in existing_user_groups.items():
+            if name not in results:
+                results[name] = dict(name=name, result='unchanged')
+                deletes.append((name, existing_user_group['usrgrpid']))
 
-    if(r):
-        return r[0]
-    else:
-        return None
+    def get_chunks(changes):
+        return [changes[i:i + batch_size] for i in range(0, len(changes), batch_size)]
+
+    apply_user_group_changes(module, zbx, 'usergroup.delete', get_chunks(deletes), 'deleted', results)
+    apply_user_group_changes(module, zbx, 'usergroup.update', get_chunks(updates), 'updated', results)
+    apply_user_group_changes(module, zbx, 'usergroup.create', get_chunks(creates), 'created', results)
+
+    result = dict(
+        changed=any(x['result'] in ('created', 'updated', 'deleted') for x in results.values()),
+        user_groups=[results[x] for x in names] + [results[x] for x in sorted(results) if x not in names]
+    )
+    failed = [x['name'] for x in result['user_groups'] if x['result'] == 'failed']
+    if failed:
+        module.fail_json(msg="Failed to reconcile user groups: %s" % ", ".join(failed), **result)
+    module.exit_json(**result)
 
 
 def main():
-    argument_spec = dict(
-        server_url=dict(type='str', required=True, aliases=['url']),
-        login_user=dict(type='str', required=True),
-        login_password=dict(type='str', required=True, no_log=True),
-        http_login_user=dict(type='str', required=False, default=None),
-        http_login_password=dict(type='str', required=False, default=None, no_log=True),
-        validate_certs=dict(type='bool', required=False, default=True),
-        user_group_name=dict(type='str', required=True),
+    argument_spec = zabbix_argument_spec()
+    argument_spec.update(
+        user_group_name=dict(type='str'),
         host_groups=dict(type='list', required=False,
                          options=dict(
                              host_group_name=dict(type='str', required=True),
@@ -182,77 +402,93 @@ def main():
                          )),
         users=dict(type='list'),
         state=dict(type='str', default='present', required=False, choices=['present', 'absent']),
-        timeout=dict(type='int', default=10)
+        user_groups=dict(type='list', elements='dict',
+                         options=dict(
+                             name=dict(type='str', required=True),
+                             host_groups=dict(type='list', elements='dict',
+                                              options=dict(
+                                                  host_group_name=dict(type='str', required=True),
+                                                  permission=dict(type='str', required=True,
+                                                                  choices=['deny', 'read', 'read-write']),
+                                              )),
+                             users=dict(type='list'),
+                             state=dict(type='str', default='present', choices=['present', 'absent'])
+                         )),
+        purge=dict(type='bool', default=False),
+        batch_size=dict(type='int', default=100)
     )
 
-    module = AnsibleModule(argument_spec, supports_check_mode=True)
+    module = AnsibleModule(argument_spec,
+                           required_one_of=[['user_group_name', 'user_groups']],
+                           mutually_exclusive=[['user_group_name', 'user_groups']],
+                           supports_check_mode=True)
 
-    if not HAS_ZABBIX_API:
-        module.fail_json(msg="Missing required zabbix-api module (check docs or install with: pip install zabbix-api)")
+    if module.params['batch_size'] < 1:
+        module.fail_json(msg="batch_size must be greater than 0.")
 
-    server_url = module.params['server_url']
-    login_user = module.params['login_user']
-    login_password = module.params['login_password']
-    http_login_user = module.params['http_login_user']
-    http_login_password = module.params['http_login_password']
-    validate_certs = module.params['validate_certs']
     user_group_name = module.params['user_group_name']
     users = module.params['users']
     host_groups = module.params['host_groups']
     state = module.params['state']
-    timeout = module.params['timeout']
 
-    try:
-        zbx = ZabbixAPI(server_url, timeout=timeout, user=http_login_user, passwd=http_login_password,
-                        validate_certs=validate_certs)
-        zbx.login(login_user, login_password)
-    except Exception as e:
-        module.fail_json(msg="Failed to connect to Zabbix server: %s" % e)
+    zbx = connect_to_zabbix(module)
 
-    host_group_permission = {
-        'deny': 0,
-        'read': 2,
-        'read-write': 3
-    }
+    if module.params['user_groups'] is not None:
+        reconcile_user_groups(module, zbx)
 
     result = dict(changed=False)
     if state == "present":
-        nested_dict = (lambda: defaultdict(nested_dict))
+        host_group_names = [x['host_group_name'] for x in host_groups or []]
+        user_names = users or []
 
-        r = check_user_group(zbx, user_group_name)
-        if(r):
+        # get the user group and look up the host groups and the users in one HTTP round trip
+        try:
+            r = zbx.batch([get_user_group_call([user_group_name])] +
+                          get_host_group_and_user_calls(host_group_names, user_names))
+        except Exception as e:
+            module.fail_json(msg="%s" % e)
+        user_group = r[0][0] if r[0] else None
+        host_group_ids, found_user_ids, missing = parse_host_group_and_user_ids(r[1:], host_group_names, user_names)
+        if missing:
+            module.fail_json(msg="%s not found." % ", ".join(missing))
+
+        rights = None
+        if host_groups is not None:
+            rights = [{'permission': HOST_GROUP_PERMISSION[x['permission']],
+                       'id': host_group_ids[x['host_group_name']]} for x in host_groups]
+        user_ids = None
+        if users is not None:
+            user_ids = [found_user_ids[x] for x in users]
+
+        if user_group:
+            params = get_user_group_update(user_group, rights, user_ids)
+            if params is None:
+                result.update(user_group)
+                module.exit_json(**result)
+
+            result['changed'] = True
+            if module.check_mode:
+                module.exit_json(**result)
+            try:
+                r = zbx.usergroup.update(params)
+            except Exception as e:
+                module.fail_json(msg="Error updating user group %s: %s" % (user_group_name, e))
             result.update(r)
             module.exit_json(**result)
 
-        exist_groups = []
-        for host_group in host_groups:
-            r = get_host_group_id(zbx, host_group['host_group_name'])
-            if(r):
-                exist_groups.append({'permission': host_group_permission[host_group['permission']],
-                                     'id': r['groupid']})
-            else:
-                module.fail_json(msg="host group %s not found." % host_group['host_group_name'])
-
-        user_ids = []
-        if(users):
-            for user in users:
-                r = get_user_id(zbx, user)
-                if(r):
-                    user_ids.append(r['userid'])
-                else:
-                    module.fail_json(msg="user %s not found." % user)
-
+        result['changed'] = True
+        if module.check_mode:
+            module.exit_json(**result)
         try:
             r = zbx.usergroup.create({
                 'name': user_group_name,
-                'rights': exist_groups,
-                'userids': user_ids
+                'rights': rights or [],
+                'userids': user_ids or []
             })
-            result['changed'] = True
-            result.update(r)
-            module.exit_json(**result)
         except Exception as e:
             module.fail_json(msg="Error adding user group %s: %s" % (user_group_name, e))
+        result.update(r)
+        module.exit_json(**result)
 
     if state == "absent":
         r = check_user_group(zbx, user_group_name)
@@ -0,0 +1,122 @@
+# (c) 2019, sky-joker <sky.jokerxx@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = """
+---
+author: sky-joker (@sky-joker)
+httpapi: zabbix
+short_description: HttpApi Plugin for Zabbix
+description:
+  - This HttpApi plugin sends the Zabbix API requests over the persistent connection.
+  - It logs in once with ansible_user and ansible_httpapi_pass, reuses the auth token for all the tasks
+    and logs out when the connection is closed.
+  - The zabbix_event_close, zabbix_host_inventory_facts and zabbix_user_group modules use it when they run with
+    C(connection=httpapi) and C(ansible_network_os=zabbix). Their server_url, login_user and login_password are not required then.
+  - ansible_user and ansible_httpapi_pass are used only for user.login and are not sent as HTTP basic auth.
+    If the Zabbix frontend is protected by HTTP basic auth, set zabbix_http_login_user and zabbix_http_login_password.
+version_added: ''
+options:
+  zabbix_url_path:
+    type: str
+    description:
+      - Specify the path of the Zabbix frontend.
+    default: /zabbix
+    vars:
+      - name: ansible_zabbix_url_path
+  zabbix_http_login_user:
+    type: str
+    description:
+      - Specify the user name of the HTTP basic auth of the Zabbix frontend, like http_login_user of the modules.
+    vars:
+      - name: ansible_zabbix_http_login_user
+  zabbix_http_login_password:
+    type: str
+    description:
+      - Specify the password of zabbix_http_login_user.
+    vars:
+      - name: ansible_zabbix_http_login_password
+"""
+
+EXAMPLES = """
+- name: Reuse one Zabbix login for all the tasks with the httpapi connection
+  hosts: zabbix_server
+  connection: httpapi
+  gather_facts: no
+  vars:
+    ansible_network_os: zabbix
+    ansible_user: username
+    ansible_httpapi_pass: password
+    ansible_httpapi_use_ssl: yes
+    ansible_zabbix_url_path: /zabbix
+  tasks:
+    - zabbix_event_close:
+        event_id: 186
+        message: auto close
+
+    - zabbix_user_group:
+        user_group_name: test group
+        state: absent
+"""
+
+import base64
+
+from ansible.module_utils._text import to_bytes, to_text
+from ansible.module_utils.connection import ConnectionError
+from ansible.module_utils.zabbix_client import ZabbixAPIError, get_jsonrpc_body, get_jsonrpc_requests, get_jsonrpc_results
+from ansible.plugins.httpapi import HttpApiBase
+
+BASE_HEADERS = {
+    'Content-Type': 'application/json-rpc'
+}
+
+
+class HttpApi(HttpApiBase):
+    def __init__(self, connection):
+        super(HttpApi, self).__init__(connection)
+        self._auth = None
+        self._request_id = 0
+
+    def get_auth_headers(self):
+        """Get the headers sent with every request, with the HTTP basic auth of the frontend if it is set"""
+        headers = dict(BASE_HEADERS)
+        http_login_user = self.get_option('zabbix_http_login_user')
+        if http_login_user:
+            credentials = '%s:%s' % (http_login_user, self.get_option('zabbix_http_login_password') or '')
+            headers['Authorization'] = 'Basic %s' % to_text(base64.b64encode(to_bytes(credentials, errors='surrogate_or_strict')))
+        return headers
+
+    def login(self, username, password):
+        # The connection sends ansible_user and ansible_httpapi_pass as HTTP basic auth while it has no auth headers.
+        self.connection._auth = self.get_auth_headers()
+        self._auth = None
+        self._auth = self.send_request('user.login', {'user': username, 'password': password})
+
+    def logout(self):
+        if self._auth:
+            self.send_request('user.logout', [])
+            self._auth = None
+
+    def send_request(self, method, params):
+        return self.send_batch([[method, params]])[0]
+
+    def send_batch(self, calls):
+        """Send the list of [method, params] in one request and return the results in the same order"""
+        data = get_jsonrpc_requests(calls, self._auth, self._request_id)
+        self._request_id += len(data)
+
+        path = '%s/api_jsonrpc.php' % self.get_option('zabbix_url_path').rstrip('/')
+        response, response_data = self.connection.send(path, get_jsonrpc_body(data), method='POST', headers=BASE_HEADERS)
+        try:
+            return get_jsonrpc_results(data, to_text(response_data.getvalue()))
+        except ZabbixAPIError as e:
+            raise ConnectionError(to_text(e))
+
+    def update_auth(self, response, response_text):
+        # The Zabbix API token is sent in the requests, so the session cookies are not used as the auth headers.
+        return None
+
+    def handle_httperror(self, exc):
+        return False
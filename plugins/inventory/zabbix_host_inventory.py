@@ -0,0 +1,265 @@
+# (c) 2019, sky-joker <sky.jokerxx@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = """
+---
+author: sky-joker (@sky-joker)
+inventory: zabbix_host_inventory
+short_description: Zabbix host inventory source
+description:
+  - Get the hosts from Zabbix with the same query as the zabbix_host_inventory_facts module.
+  - The host groups of Zabbix are added as the Ansible groups and the inventory fields as the host variables.
+  - The hosts are cached with the inventory cache, so the runs within cache_timeout do not call the Zabbix API.
+  - The configuration file name must end with zabbix.yml or zabbix.yaml.
+version_added: ''
+extends_documentation_fragment:
+  - constructed
+  - inventory_cache
+requirements:
+  - requests
+options:
+  plugin:
+    description:
+      - The name of this plugin, it should always be set to C(zabbix_host_inventory) for this plugin to recognize it as it's own.
+    required: True
+    choices: ['zabbix_host_inventory']
+  server_url:
+    type: str
+    description:
+      - Specify the URL of Zabbix server.
+    required: True
+    env:
+      - name: ZABBIX_SERVER_URL
+  login_user:
+    type: str
+    description:
+      - Specify the user name of Zabbix.
+    required: True
+    env:
+      - name: ZABBIX_LOGIN_USER
+  login_password:
+    type: str
+    description:
+      - Specify the password of login_user.
+    required: True
+    env:
+      - name: ZABBIX_LOGIN_PASSWORD
+  http_login_user:
+    type: str
+    description:
+      - Specify the user name of the basic authentication.
+  http_login_password:
+    type: str
+    description:
+      - Specify the password of the basic authentication.
+  validate_certs:
+    type: bool
+    description:
+      - Specify whether to validate the SSL certificate.
+    default: True
+  timeout:
+    type: int
+    description:
+      - Specify the timeout seconds of the Zabbix API requests.
+    default: 10
+  host_groups:
+    type: list
+    description:
+      - Specify the host group names to get only the hosts in them.
+  templates:
+    type: list
+    description:
+      - Specify the template names to get only the hosts linked to them.
+  tags:
+    type: list
+    description:
+      - Specify the host tags to get only the hosts having them.
+      - Each element is a dict of tag, value and operator (C(like) or C(equal)).
+  inventory_search:
+    type: dict
+    description:
+      - Specify the inventory fields and values to search the hosts.
+  host_fields:
+    type: list
+    description:
+      - Specify the host fields to get.
+      - hostid, host and name are always got.
+      - All the fields are got if not specified.
+  inventory_fields:
+    type: list
+    description:
+      - Specify the inventory fields to get.
+      - All the fields are got if not specified.
+  page_size:
+    type: int
+    description:
+      - Specify the number of the hosts got in one host.get call.
+      - The hosts are got in one call if 0 is specified.
+    default: 1000
+  max_workers:
+    type: int
+    description:
+      - Specify the number of the pages got concurrently.
+    default: 1
+  use_visible_name:
+    type: bool
+    description:
+      - Specify whether to use the visible name of the host as the inventory hostname instead of the host name.
+    default: False
+  vars_prefix:
+    type: str
+    description:
+      - Specify the prefix of the host variables of the host and inventory fields.
+    default: zabbix_
+  group_prefix:
+    type: str
+    description:
+      - Specify the prefix of the groups made from the host groups of Zabbix.
+    default: ''
+"""
+
+EXAMPLES = """
+# zabbix.yml
+plugin: zabbix_host_inventory
+server_url: http://zabbix.local/zabbix
+login_user: Admin
+login_password: zabbix
+host_groups:
+  - Linux servers
+inventory_fields:
+  - os
+  - location
+cache: True
+cache_plugin: jsonfile
+cache_connection: /tmp/zabbix_inventory
+cache_timeout: 3600
+keyed_groups:
+  - key: zabbix_inventory.os
+    prefix: os
+"""
+
+from ansible.errors import AnsibleError
+from ansible.inventory.group import to_safe_group_name
+from ansible.module_utils._text import to_native
+from ansible.plugins.inventory import BaseInventoryPlugin, Constructable, Cacheable
+
+try:
+    from ansible.module_utils.zabbix_client import HAS_REQUESTS, ZabbixHostQuery, ZabbixJsonRpcClient
+    HAS_ZABBIX_CLIENT = True
+except ImportError:
+    HAS_ZABBIX_CLIENT = False
+
+
+class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
+
+    NAME = 'zabbix_host_inventory'
+
+    def verify_file(self, path):
+        valid = False
+        if super(InventoryModule, self).verify_file(path):
+            if path.endswith(('zabbix.yml', 'zabbix.yaml')):
+                valid = True
+        return valid
+
+    def get_hosts(self):
+        """Get the hosts with their host groups, main interfaces and inventory"""
+        if not HAS_ZABBIX_CLIENT or not HAS_REQUESTS:
+            raise AnsibleError('The zabbix_host_inventory plugin requires the zabbix_client module_utils and requests.')
+
+        host_fields = self.get_option('host_fields')
+        if host_fields and 'host' not in host_fields:
+            host_fields = host_fields + ['host']
+
+        zbx = ZabbixJsonRpcClient(self.get_option('server_url'),
+                                  timeout=self.get_option('timeout'),
+                                  http_login_user=self.get_option('http_login_user'),
+                                  http_login_password=self.get_option('http_login_password'),
+                                  validate_certs=self.get_option('validate_certs'))
+        try:
+            zbx.login(self.get_option('login_user'), self.get_option('login_password'))
+            query = ZabbixHostQuery(zbx,
+                                    host_fields=host_fields,
+                                    inventory_fields=self.get_option('inventory_fields'),
+                                    page_size=self.get_option('page_size'),
+                                    max_workers=self.get_option('max_workers'))
+            params = {
+                'selectGroups': ['name'],
+                'selectInterfaces': ['ip', 'dns', 'useip', 'main']
+            }
+            params.update(query.get_scope_params(host_groups=self.get_option('host_groups'),
+                                                 templates=self.get_option('templates'),
+                                                 tags=self.get_option('tags'),
+                                                 inventory_search=self.get_option('inventory_search')))
+            params.update(query.get_output_params())
+            hosts = query.get_hosts(params)
+            zbx.logout()
+        except Exception as e:
+            raise AnsibleError('Failed to get the hosts from Zabbix: %s' % to_native(e))
+
+        return hosts
+
+    def get_ansible_host(self, host):
+        """Get the address of the main interface"""
+        for interface in host.get('interfaces', []):
+            if str(interface.get('main')) == '1':
+                if str(interface.get('useip')) == '1':
+                    return interface.get('ip')
+                return interface.get('dns')
+        return None
+
+    def populate(self, hosts):
+        vars_prefix = self.get_option('vars_prefix')
+        group_prefix = self.get_option('group_prefix')
+        strict = self.get_option('strict')
+
+        for host in hosts:
+            if self.get_option('use_visible_name'):
+                hostname = host['name']
+            else:
+                hostname = host.get('host') or host['name']
+            self.inventory.add_host(hostname)
+
+            for group in host.get('groups', []):
+                group_name = self.inventory.add_group(to_safe_group_name('%s%s' % (group_prefix, group['name'])))
+                self.inventory.add_child(group_name, hostname)
+
+            ansible_host = self.get_ansible_host(host)
+            if ansible_host:
+                self.inventory.set_variable(hostname, 'ansible_host', ansible_host)
+
+            for key, value in host.items():
+                if key in ('groups', 'interfaces'):
+                    continue
+                self.inventory.set_variable(hostname, '%s%s' % (vars_prefix, key), value)
+
+            host_vars = self.inventory.get_host(hostname).get_vars()
+            self._set_composite_vars(self.get_option('compose'), host_vars, hostname, strict=strict)
+            self._add_host_to_composed_groups(self.get_option('groups'), host_vars, hostname, strict=strict)
+            self._add_host_to_keyed_groups(self.get_option('keyed_groups'), host_vars, hostname, strict=strict)
+
+    def parse(self, inventory, loader, path, cache=True):
+        super(InventoryModule, self).parse(inventory, loader, path)
+        self._read_config_data(path)
+
+        cache_key = self.get_cache_key(path)
+        user_cache_setting = self.get_option('cache')
+        attempt_to_read_cache = user_cache_setting and cache
+        cache_needs_update = user_cache_setting and not cache
+
+        hosts = None
+        if attempt_to_read_cache:
+            try:
+                hosts = self._cache[cache_key]
+            except KeyError:
+                cache_needs_update = True
+
+        if hosts is None:
+            hosts = self.get_hosts()
+
+        if cache_needs_update:
+            self._cache[cache_key] = hosts
+
+        self.populate(hosts)
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019, sky-joker
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""API call and request counts of the Zabbix modules against the local Zabbix API stand-in
+
+The number of the hosts can be changed with ZABBIX_STUB_HOSTS.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import os
+
+import pytest
+
+from ansible.module_utils import basic
+from ansible.modules.salf_made.monitoring.zabbix import zabbix_event_close
+from ansible.modules.salf_made.monitoring.zabbix import zabbix_host_inventory_facts
+from ansible.modules.salf_made.monitoring.zabbix import zabbix_user_group
+from units.modules.utils import AnsibleExitJson, AnsibleFailJson, exit_json, fail_json, set_module_args
+
+from zabbix_api_stub import ZabbixAPIStub, ZabbixAPIStubServer
+
+HOSTS = int(os.environ.get('ZABBIX_STUB_HOSTS', 10000))
+PAGE_SIZE = 1000
+
+
+def pages(count, page_size):
+    return (count + page_size - 1) // page_size
+
+
+@pytest.fixture(autouse=True)
+def patch_ansible_module(monkeypatch):
+    monkeypatch.setattr(basic.AnsibleModule, 'exit_json', exit_json)
+    monkeypatch.setattr(basic.AnsibleModule, 'fail_json', fail_json)
+
+
+@pytest.fixture
+def stub():
+    return ZabbixAPIStub(hosts=HOSTS)
+
+
+@pytest.fixture
+def server(stub):
+    server = ZabbixAPIStubServer(stub).start()
+    yield server
+    server.stop()
+
+
+def run_module(module, server, args, expected=AnsibleExitJson):
+    """Run the module and return the result, the API calls and the HTTP requests"""
+    args = dict(args)
+    if 'servers' not in args:
+        args.setdefault('server_url', server.url)
+    args.setdefault('login_user', 'Admin')
+    args.setdefault('login_password', 'zabbix')
+    set_module_args(args)
+
+    server.stub.reset_stats()
+    with pytest.raises(expected) as e:
+        module.main()
+
+    return e.value.args[0], dict(server.stub.calls), server.stub.requests
+
+
+def test_host_inventory_facts_pages(server):
+    result, calls, requests = run_module(zabbix_host_inventory_facts, server, {'page_size': PAGE_SIZE})
+
+    assert len(result['hosts_inventory']) == HOSTS
+    assert calls['host.get'] == 1 + pages(HOSTS, PAGE_SIZE)
+    assert requests == 1 + calls['host.get']
+
+
+def test_host_inventory_facts_concurrent_pages(stub, server):
+    stub.latency = 0.05
+    args = {'page_size': PAGE_SIZE, 'inventory_fields': ['os']}
+    serial = run_module(zabbix_host_inventory_facts, server, dict(args, max_workers=1))
+    assert stub.max_active == 1
+
+    concurrent = run_module(zabbix_host_inventory_facts, server, dict(args, max_workers=5))
+    assert stub.max_active > 1
+    assert concurrent[0]['hosts_inventory'] == serial[0]['hosts_inventory']
+    assert concurrent[1] == serial[1]
+
+
+def test_host_inventory_facts_projection(server):
+    result, calls, requests = run_module(zabbix_host_inventory_facts, server, {
+        'host_fields': ['host'],
+        'inventory_fields': ['os', 'location']
+    })
+
+    assert len(result['hosts_inventory']) == HOSTS
+    for zabbix_host in result['hosts_inventory']:
+        assert sorted(zabbix_host) == ['host', 'hostid', 'inventory', 'name']
+        assert sorted(zabbix_host['inventory']) == ['location', 'os']
+
+
+def test_host_inventory_facts_scope(server):
+    result, calls, requests = run_module(zabbix_host_inventory_facts, server, {
+        'host_groups': ['Linux servers'],
+        'tags': [{'tag': 'env', 'value': 'prod', 'operator': 'equal'}],
+        'inventory_search': {'location': 'Osaka'}
+    })
+
+    assert result['hosts_inventory']
+    assert calls['hostgroup.get'] == 1
+    assert all(x['inventory']['location'] == 'Osaka' for x in result['hosts_inventory'])
+
+
+def test_host_inventory_facts_host_ip(stub, server):
+    host_ips = [x['ip'] for x in stub.interfaces[:100]] + ['192.0.2.1']
+    result, calls, requests = run_module(zabbix_host_inventory_facts, server, {'host_ip': host_ips})
+
+    assert len(result['hosts_inventory']) == 100
+    assert result['missing_host_ips'] == ['192.0.2.1']
+    assert calls['hostinterface.get'] == 1
+    assert calls['host.get'] == 2
+
+
+def test_host_inventory_facts_servers(stub):
+    # both servers share the stub to count the requests handled at the same time
+    stub.latency = 0.3
+    servers = [ZabbixAPIStubServer(stub).start() for i in range(2)]
+    try:
+        result, calls, requests = run_module(zabbix_host_inventory_facts, servers[0], {
+            'servers': [{'server_url': servers[0].url}, {'server_url': servers[1].url, 'login_user': 'test'}],
+            'page_size': 0
+        })
+    finally:
+        for server in servers:
+            server.stop()
+
+    assert len(result['hosts_inventory']) == HOSTS * 2
+    assert set(x['zabbix_server_url'] for x in result['hosts_inventory']) == set(x.url for x in servers)
+    assert [x['api_calls'] for x in result['servers']] == [3, 3]
+    assert requests == 6
+    # login, host.get and logout of the servers are sent concurrently
+    assert stub.max_active == 2
+
+
+def test_host_inventory_facts_servers_error(server):
+    result, calls, requests = run_module(zabbix_host_inventory_facts, server, {
+        'servers': [{'server_url': server.url}, {'server_url': 'http://127.0.0.1:1'}],
+        'page_size': 0
+    })
+
+    assert len(result['hosts_inventory']) == HOSTS
+    assert 'error' in result['servers'][1]
+
+
+def test_host_inventory_facts_servers_not_found(server, tmpdir):
+    region = ZabbixAPIStubServer(ZabbixAPIStub(hosts=3, host_groups=0)).start()
+    args = {
+        'servers': [{'server_url': server.url}, {'server_url': region.url}],
+        'snapshot_file': str(tmpdir.join('snapshot.json')),
+        'page_size': 0
+    }
+    try:
+        result = run_module(zabbix_host_inventory_facts, server, args)[0]
+        assert len(result['hosts_delta']['added']) == HOSTS + 3
+
+        del region.stub.hosts[:]
+        result = run_module(zabbix_host_inventory_facts, server, args)[0]
+        assert 'error' not in result['servers'][1]
+        assert result['servers'][1]['hosts_count'] == 0
+        assert [x['zabbix_server_url'] for x in result['hosts_delta']['removed']] == [region.url] * 3
+
+        result = run_module(zabbix_host_inventory_facts, server, dict(args, host_groups=['group001']))[0]
+        assert 'error' not in result['servers'][1]
+        assert result['servers'][0]['hosts_count'] > 0
+    finally:
+        region.stop()
+
+
+def test_host_inventory_facts_snapshot(stub, server, tmpdir):
+    args = {'snapshot_file': str(tmpdir.join('snapshot.json')), 'inventory_fields': ['os']}
+
+    result = run_module(zabbix_host_inventory_facts, server, args)[0]
+    assert len(result['hosts_delta']['added']) == HOSTS
+
+    result = run_module(zabbix_host_inventory_facts, server, args)[0]
+    assert result['hosts_delta'] == {'added': [], 'changed': [], 'removed': []}
+
+    stub.hosts[0]['inventory']['os'] = 'CentOS 8'
+    stub.hosts.pop()
+    result = run_module(zabbix_host_inventory_facts, server, args)[0]
+    assert [x['hostid'] for x in result['hosts_delta']['changed']] == [stub.hosts[0]['hostid']]
+    assert len(result['hosts_delta']['removed']) == 1
+    assert result['hosts_count'] == HOSTS - 1
+
+
+def test_event_close_sweep(stub, server, tmpdir):
+    problems = len(stub.problems)
+    args = {
+        'state_file': str(tmpdir.join('sweep.json')),
+        'page_size': PAGE_SIZE,
+        'batch_size': 500,
+        'message': 'benchmark'
+    }
+
+    result, calls, requests = run_module(zabbix_event_close, server, args)
+    assert len(result['event_ids']) == problems
+    assert calls['problem.get'] == pages(problems, PAGE_SIZE) + (1 if problems % PAGE_SIZE == 0 else 0)
+    assert calls['event.acknowledge'] == pages(problems, 500)
+    assert not stub.problems
+
+    result, calls, requests = run_module(zabbix_event_close, server, args)
+    assert result['event_ids'] == []
+    assert calls == {'user.login': 1, 'problem.get': 1}
+
+
+def test_event_close_severities(stub, server):
+    disasters = len([x for x in stub.problems if x['severity'] == '5'])
+    result, calls, requests = run_module(zabbix_event_close, server, {
+        'severities': ['disaster'],
+        'batch_size': 100
+    })
+
+    assert len(result['event_ids']) == disasters
+    assert calls['problem.get'] == 1
+    assert calls['event.acknowledge'] == pages(disasters, 100)
+
+
+def test_event_close_not_closable(stub, server, tmpdir):
+    not_closable = [x['eventid'] for x in stub.problems[::7]]
+    for problem in stub.problems[::7]:
+        stub.triggers[problem['objectid']]['manual_close'] = '0'
+    problems = len(stub.problems)
+    args = {
+        'state_file': str(tmpdir.join('sweep.json')),
+        'page_size': PAGE_SIZE,
+        'message': 'benchmark'
+    }
+
+    result, calls, requests = run_module(zabbix_event_close, server, args)
+    assert result['not_closable_event_ids'] == not_closable
+    assert len(result['event_ids']) == problems - len(not_closable)
+    assert result['last_event_id'] == str(problems)
+    assert calls['trigger.get'] == pages(problems, PAGE_SIZE)
+    assert [x['eventid'] for x in stub.problems] == not_closable
+
+    result, calls, requests = run_module(zabbix_event_close, server, args)
+    assert result['event_ids'] == [] and result['not_closable_event_ids'] == []
+
+    result, calls, requests = run_module(zabbix_event_close, server, {'event_id': not_closable[:3]})
+    assert not result['changed']
+    assert result['not_closable_event_ids'] == not_closable[:3]
+
+
+def test_user_group_lookups(stub, server):
+    users = sorted(stub.users.values())
+    args = {
+        'user_group_name': 'benchmark group',
+        'host_groups': [{'host_group_name': 'Linux servers', 'permission': 'read'},
+                        {'host_group_name': 'Hypervisors', 'permission': 'deny'}],
+        'users': users
+    }
+
+    result, calls, requests = run_module(zabbix_user_group, server, args)
+    assert result['changed']
+    assert calls == {'user.login': 1, 'usergroup.get': 1, 'hostgroup.get': 1, 'user.get': 1, 'usergroup.create': 1}
+    assert requests == 3
+
+    result, calls, requests = run_module(zabbix_user_group, server, args)
+    assert not result['changed']
+    assert requests == 2
+
+    args['host_groups'][0]['permission'] = 'read-write'
+    args['users'] = users[:10]
+    result, calls, requests = run_module(zabbix_user_group, server, args)
+    assert result['changed']
+    assert calls['usergroup.update'] == 1
+    assert requests == 3
+
+
+def test_user_group_missing_names(server):
+    result, calls, requests = run_module(zabbix_user_group, server, {
+        'user_group_name': 'benchmark group',
+        'host_groups': [{'host_group_name': 'No such group', 'permission': 'read'}],
+        'users': ['Admin', 'nobody']
+    }, expected=AnsibleFailJson)
+
+    assert 'No such group' in result['msg']
+    assert 'nobody' in result['msg']
+    assert 'usergroup.create' not in calls
+
+
+def test_user_groups_bulk(stub, server):
+    users = sorted(stub.users.values())
+    args = {
+        'user_groups': [{
+            'name': 'benchmark group %03d' % i,
+            'host_groups': [{'host_group_name': 'group%03d' % (i % 50), 'permission': 'read'}],
+            'users': users[i % len(users):i % len(users) + 5]
+        } for i in range(400)],
+        'batch_size': 100
+    }
+
+    result, calls, requests = run_module(zabbix_user_group, server, args)
+    assert result['changed']
+    assert all(x['result'] == 'created' for x in result['user_groups'])
+    assert calls['usergroup.create'] == 4
+    assert requests == 1 + 1 + 4
+
+    result, calls, requests = run_module(zabbix_user_group, server, args)
+    assert not result['changed']
+    assert requests == 2
+
+    args['user_groups'][0]['users'] = []
+    args['user_groups'].append({'name': 'benchmark group 000', 'state': 'absent'})
+    run_module(zabbix_user_group, server, args, expected=AnsibleFailJson)
+
+    args['user_groups'].pop()
+    args['user_groups'][1]['state'] = 'absent'
+    result, calls, requests = run_module(zabbix_user_group, server, args)
+    assert [x['result'] for x in result['user_groups'][:3]] == ['updated', 'deleted', 'unchanged']
+    assert calls['usergroup.update'] == 1
+    assert calls['usergroup.delete'] == 1
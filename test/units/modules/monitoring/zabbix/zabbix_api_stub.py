@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019, sky-joker
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Local JSON-RPC stand-in of the Zabbix API
+
+It emulates the API methods used by the Zabbix modules on a generated dataset,
+counts the HTTP requests and the calls of each method, and can add a latency to each HTTP request.
+The most HTTP requests handled at the same time are recorded to max_active to check the concurrency.
+
+It can also be run to serve the integration tests:
+
+    python zabbix_api_stub.py --hosts 10000 --latency 0.01 --port 8080
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+HOST_FIELDS = ('hostid', 'host', 'name', 'status', 'proxy_hostid', 'description')
+INTERFACE_FIELDS = ('interfaceid', 'hostid', 'ip', 'dns', 'useip', 'main', 'type', 'port')
+BUILTIN_HOST_GROUPS = ('Linux servers', 'Hypervisors', 'Virtual machines')
+BUILTIN_USERS = ('Admin', 'test')
+BUILTIN_USER_GROUPS = ('Zabbix administrators', 'Guests')
+
+
+class ZabbixAPIStubError(Exception):
+    def __init__(self, code, message, data=''):
+        super(ZabbixAPIStubError, self).__init__(message)
+        self.code = code
+        self.message = message
+        self.data = data
+
+
+def project(obj, output):
+    """Get the fields of output, 'extend' meaning all the fields"""
+    if output == 'extend' or output is None:
+        return dict(obj)
+    if isinstance(output, str):
+        output = [output]
+    return dict((x, obj[x]) for x in output if x in obj)
+
+
+def as_list(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple, set)):
+        return list(value)
+    return [value]
+
+
+def match_filter(obj, filters):
+    """Whether the object has one of the values of each field of filter"""
+    for key, values in (filters or {}).items():
+        if str(obj.get(key)) not in [str(x) for x in as_list(values)]:
+            return False
+    return True
+
+
+def match_search(obj, search):
+    """Whether the object contains one of the values of each field of search"""
+    for key, values in (search or {}).items():
+        if not any(str(x).lower() in str(obj.get(key, '')).lower() for x in as_list(values)):
+            return False
+    return True
+
+
+class ZabbixAPIStub(object):
+    """Dataset and API methods of the stand-in"""
+    def __init__(self, hosts=10000, host_groups=50, users=200, templates=10, problems=None, latency=0.0):
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._tokens = set()
+        self._next_id = 1000000
+        self._active = 0
+        self.reset_stats()
+
+        self.host_groups = {}
+        for name in list(BUILTIN_HOST_GROUPS) + ['group%03d' % i for i in range(host_groups)]:
+            self.host_groups[self.new_id()] = name
+
+        self.templates = {}
+        for i in range(templates):
+            self.templates[self.new_id()] = 'Template %02d' % i
+
+        self.users = {}
+        for alias in list(BUILTIN_USERS) + ['user%04d' % i for i in range(users)]:
+            self.users[self.new_id()] = alias
+
+        self.user_groups = {}
+        for name in BUILTIN_USER_GROUPS:
+            self.user_groups[self.new_id()] = {'name': name, 'gui_access': '0', 'users_status': '0',
+                                               'debug_mode': '0', 'rights': [], 'userids': []}
+
+        group_ids = sorted(self.host_groups, key=int)
+        template_ids = sorted(self.templates, key=int)
+        self.hosts = []
+        self.interfaces = []
+        for i in range(hosts):
+            host_id = str(10000 + i)
+            name = 'host%06d' % i
+            self.hosts.append({
+                'hostid': host_id,
+                'host': name,
+                'name': name,
+                'status': '0',
+                'proxy_hostid': '0',
+                'description': '',
+                'groupids': [group_ids[i % len(group_ids)]],
+                'templateids': [template_ids[i % len(template_ids)]] if template_ids else [],
+                'tags': [{'tag': 'env', 'value': 'prod' if i % 2 else 'dev'}],
+                'inventory': {
+                    'type': 'server',
+                    'name': name,
+                    'os': ['CentOS 7', 'Ubuntu 18.04', 'Windows Server 2016'][i % 3],
+                    'location': ['Tokyo', 'Osaka'][i % 2],
+                    'serialno_a': 'SN%08d' % i,
+                    'contact': '',
+                    'notes': ''
+                }
+            })
+            self.interfaces.append({
+                'interfaceid': str(i + 1),
+                'hostid': host_id,
+                'ip': '10.%d.%d.%d' % (i // 65536 % 256, i // 256 % 256, i % 256),
+                'dns': '%s.example.com' % name,
+                'useip': '1',
+                'main': '1',
+                'type': '1',
+                'port': '10050'
+            })
+        self.hosts_by_id = dict((x['hostid'], x) for x in self.hosts)
+        self.interfaces_by_host_id = dict((x['hostid'], [x]) for x in self.interfaces)
+
+        self.triggers = {}
+        self.problems = []
+        if problems is None:
+            problems = hosts // 10
+        now = int(time.time())
+        for i in range(problems):
+            zabbix_host = self.hosts[i * 10 % len(self.hosts)] if self.hosts else {'hostid': '0', 'name': ''}
+            trigger_id = self.new_id()
+            self.triggers[trigger_id] = {'triggerid': trigger_id, 'description': 'Problem %d' % (i % 20),
+                                         'hostid': zabbix_host['hostid'], 'manual_close': '1'}
+            self.problems.append({
+                'eventid': str(i + 1),
+                'source': '0',
+                'object': '0',
+                'objectid': trigger_id,
+                'clock': str(now - (problems - i) * 60),
+                'severity': str(i % 6),
+                'name': self.triggers[trigger_id]['description'],
+                'hostid': zabbix_host['hostid']
+            })
+
+    def new_id(self):
+        self._next_id += 1
+        return str(self._next_id)
+
+    def reset_stats(self):
+        self.requests = 0
+        self.max_active = 0
+        self.calls = Counter()
+
+    def handle(self, request):
+        """Handle a JSON-RPC request, or a list of them as a batch request"""
+        with self._lock:
+            self.requests += 1
+            self._active += 1
+            self.max_active = max(self.max_active, self._active)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+
+            if isinstance(request, list):
+                return [self.handle_call(x) for x in request]
+            return self.handle_call(request)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def handle_call(self, request):
+        method = request.get('method', '')
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+        with self._lock:
+            self.calls[method] += 1
+            try:
+                if method not in ('user.login', 'apiinfo.version') and request.get('auth') not in self._tokens:
+                    raise ZabbixAPIStubError(-32602, 'Invalid params.', 'Not authorised.')
+                handler = getattr(self, 'api_%s' % method.replace('.', '_'), None)
+                if handler is None:
+                    raise ZabbixAPIStubError(-32601, 'Method not found.', 'Incorrect method "%s".' % method)
+                response['result'] = handler(request.get('params') or {})
+            except ZabbixAPIStubError as e:
+                response['error'] = {'code': e.code, 'message': e.message, 'data': e.data}
+        return response
+
+    def api_apiinfo_version(self, params):
+        return '4.0.0'
+
+    def api_user_login(self, params):
+        if params.get('user') not in self.users.values() or not params.get('password'):
+            raise ZabbixAPIStubError(-32602, 'Invalid params.', 'Login name or password is incorrect.')
+        token = uuid.uuid4().hex
+        self._tokens.add(token)
+        return token
+
+    def api_user_logout(self, params):
+        return True
+
+    def api_user_get(self, params):
+        users = [{'userid': k, 'alias': v} for k, v in sorted(self.users.items())]
+        return [project(x, params.get('output')) for x in users if match_filter(x, params.get('filter'))]
+
+    def api_hostgroup_get(self, params):
+        groups = [{'groupid': k, 'name': v} for k, v in sorted(self.host_groups.items())]
+        return [project(x, params.get('output')) for x in groups if match_filter(x, params.get('filter'))]
+
+    def api_template_get(self, params):
+        templates = [{'templateid': k, 'host': v, 'name': v} for k, v in sorted(self.templates.items())]
+        return [project(x, params.get('output')) for x in templates if match_filter(x, params.get('filter'))]
+
+    def api_trigger_get(self, params):
+        trigger_ids = set(str(x) for x in as_list(params.get('triggerids')) or [])
+        triggers = [self.triggers[x] for x in sorted(self.triggers) if not trigger_ids or x in trigger_ids]
+        return [project(x, params.get('output')) for x in triggers if match_filter(x, params.get('filter'))]
+
+    def match_tags(self, zabbix_host, tags):
+        for tag in tags or []:
+            if tag.get('operator', 0) in (1, '1'):
+                matched = any(x['tag'] == tag['tag'] and x['value'] == tag.get('value', '')
+                              for x in zabbix_host['tags'])
+            else:
+                matched = any(x['tag'] == tag['tag'] and tag.get('value', '').lower() in x['value'].lower()
+                              for x in zabbix_host['tags'])
+            if not matched:
+                return False
+        return True
+
+    def api_host_get(self, params):
+        host_ids = as_list(params.get('hostids'))
+        if host_ids is not None:
+            host_ids = set(str(x) for x in host_ids)
+        group_ids = set(str(x) for x in as_list(params.get('groupids')) or [])
+        template_ids = set(str(x) for x in as_list(params.get('templateids')) or [])
+
+        result = []
+        for zabbix_host in self.hosts:
+            if host_ids is not None and zabbix_host['hostid'] not in host_ids:
+                continue
+            if group_ids and not group_ids.intersection(zabbix_host['groupids']):
+                continue
+            if template_ids and not template_ids.intersection(zabbix_host['templateids']):
+                continue
+            if not match_filter(zabbix_host, params.get('filter')) or not match_search(zabbix_host, params.get('search')):
+                continue
+            if not self.match_tags(zabbix_host, params.get('tags')):
+                continue
+            if not match_search(zabbix_host['inventory'], params.get('searchInventory')):
+                continue
+
+            output = params.get('output', 'extend')
+            if output == 'extend':
+                output = HOST_FIELDS
+            obj = project(dict((x, zabbix_host[x]) for x in HOST_FIELDS), output)
+            if params.get('selectInventory'):
+                obj['inventory'] = project(zabbix_host['inventory'], params['selectInventory'])
+            if params.get('selectGroups'):
+                obj['groups'] = [project({'groupid': x, 'name': self.host_groups[x]}, params['selectGroups'])
+                                 for x in zabbix_host['groupids']]
+            if params.get('selectInterfaces'):
+                obj['interfaces'] = [project(x, params['selectInterfaces'])
+                                     for x in self.interfaces_by_host_id[zabbix_host['hostid']]]
+            result.append(obj)
+        return result
+
+    def api_hostinterface_get(self, params):
+        output = params.get('output', 'extend')
+        if output == 'extend':
+            output = INTERFACE_FIELDS
+        return [project(x, output) for x in self.interfaces if match_filter(x, params.get('filter'))]
+
+    def get_user_group(self, user_group_id, params):
+        user_group = self.user_groups[user_group_id]
+        obj = dict((k, v) for k, v in user_group.items() if k not in ('rights', 'userids'))
+        obj['usrgrpid'] = user_group_id
+        obj = project(obj, params.get('output', 'extend'))
+        if params.get('selectRights'):
+            obj['rights'] = [project(x, params['selectRights']) for x in user_group['rights']]
+        if params.get('selectUsers'):
+            obj['users'] = [project({'userid': x, 'alias': self.users[x]}, params['selectUsers'])
+                            for x in user_group['userids']]
+        return obj
+
+    def api_usergroup_get(self, params):
+        result = []
+        for user_group_id in sorted(self.user_groups, key=int):
+            if match_filter(dict(self.user_groups[user_group_id], usrgrpid=user_group_id), params.get('filter')):
+                result.append(self.get_user_group(user_group_id, params))
+        return result
+
+    def set_user_group(self, user_group, params):
+        if 'rights' in params:
+            for right in params['rights']:
+                if str(right['id']) not in self.host_groups:
+                    raise ZabbixAPIStubError(-32500, 'Application error.', 'Host group "%s" does not exist.' % right['id'])
+            user_group['rights'] = [{'id': str(x['id']), 'permission': str(x['permission'])} for x in params['rights']]
+        if 'userids' in params:
+            for user_id in params['userids']:
+                if str(user_id) not in self.users:
+                    raise ZabbixAPIStubError(-32500, 'Application error.', 'User "%s" does not exist.' % user_id)
+            user_group['userids'] = [str(x) for x in params['userids']]
+
+    def api_usergroup_create(self, params):
+        names = set(x['name'] for x in self.user_groups.values())
+        user_group_ids = []
+        for obj in as_list(params):
+            if obj['name'] in names:
+                raise ZabbixAPIStubError(-32602, 'Invalid params.', 'User group "%s" already exists.' % obj['name'])
+            user_group = {'name': obj['name'], 'gui_access': '0', 'users_status': '0', 'debug_mode': '0',
+                          'rights': [], 'userids': []}
+            self.set_user_group(user_group, obj)
+            user_group_id = self.new_id()
+            self.user_groups[user_group_id] = user_group
+            names.add(obj['name'])
+            user_group_ids.append(user_group_id)
+        return {'usrgrpids': user_group_ids}
+
+    def api_usergroup_update(self, params):
+        user_group_ids = []
+        for obj in as_list(params):
+            user_group_id = str(obj['usrgrpid'])
+            if user_group_id not in self.user_groups:
+                raise ZabbixAPIStubError(-32500, 'Application error.', 'No permissions to referred object or it does not exist!')
+            self.set_user_group(self.user_groups[user_group_id], obj)
+            user_group_ids.append(user_group_id)
+        return {'usrgrpids': user_group_ids}
+
+    def api_usergroup_delete(self, params):
+        user_group_ids = [str(x) for x in as_list(params)]
+        for user_group_id in user_group_ids:
+            if user_group_id not in self.user_groups:
+                raise ZabbixAPIStubError(-32500, 'Application error.', 'No permissions to referred object or it does not exist!')
+        for user_group_id in user_group_ids:
+            del self.user_groups[user_group_id]
+        return {'usrgrpids': user_group_ids}
+
+    def api_problem_get(self, params):
+        event_ids = set(str(x) for x in as_list(params.get('eventids')) or [])
+        host_ids = set(str(x) for x in as_list(params.get('hostids')) or [])
+        group_ids = set(str(x) for x in as_list(params.get('groupids')) or [])
+        object_ids = set(str(x) for x in as_list(params.get('objectids')) or [])
+        severities = set(str(x) for x in as_list(params.get('severities')) or [])
+
+        result = []
+        for problem in self.problems:
+            if event_ids and problem['eventid'] not in event_ids:
+                continue
+            if host_ids and problem['hostid'] not in host_ids:
+                continue
+            if group_ids and not group_ids.intersection(self.hosts_by_id[problem['hostid']]['groupids']):
+                continue
+            if object_ids and problem['objectid'] not in object_ids:
+                continue
+            if severities and problem['severity'] not in severities:
+                continue
+            if 'time_till' in params and int(problem['clock']) > int(params['time_till']):
+                continue
+            if 'eventid_from' in params and int(problem['eventid']) < int(params['eventid_from']):
+                continue
+            result.append(problem)
+
+        if params.get('sortorder') == 'DESC':
+            result.reverse()
+        if params.get('limit'):
+            result = result[:int(params['limit'])]
+        return [project(x, params.get('output', 'extend')) for x in result]
+
+    def api_event_acknowledge(self, params):
+        event_ids = set(str(x) for x in as_list(params.get('eventids')))
+        if int(params.get('action', 0)) & 1:
+            for problem in self.problems:
+                if problem['eventid'] in event_ids and self.triggers[problem['objectid']]['manual_close'] != '1':
+                    raise ZabbixAPIStubError(-32500, 'Application error.',
+                                             'Cannot close problem: trigger does not allow manual closing.')
+            self.problems = [x for x in self.problems if x['eventid'] not in event_ids]
+        return {'eventids': sorted(event_ids, key=int)}
+
+
+class ZabbixAPIStubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        try:
+            request = json.loads(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+            response = self.server.stub.handle(request)
+        except ValueError:
+            response = {'jsonrpc': '2.0', 'id': None,
+                        'error': {'code': -32700, 'message': 'Parse error.', 'data': 'Invalid JSON.'}}
+
+        data = json.dumps(response).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class ZabbixAPIStubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, stub, host='127.0.0.1', port=0):
+        HTTPServer.__init__(self, (host, port), ZabbixAPIStubHandler)
+        self.stub = stub
+        self.url = 'http://%s:%s' % (host, self.server_address[1])
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local JSON-RPC stand-in of the Zabbix API')
+    parser.add_argument('--hosts', type=int, default=10000, help='number of the hosts')
+    parser.add_argument('--host-groups', type=int, default=50, help='number of the host groups')
+    parser.add_argument('--users', type=int, default=200, help='number of the users')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to each HTTP request')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen')
+    parser.add_argument('--port', type=int, default=8080, help='port to listen')
+    args = parser.parse_args()
+
+    stub = ZabbixAPIStub(hosts=args.hosts, host_groups=args.host_groups, users=args.users, latency=args.latency)
+    server = ZabbixAPIStubServer(stub, host=args.host, port=args.port)
+    print('Serving the Zabbix API stand-in on %s (login with Admin and any password)' % server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()